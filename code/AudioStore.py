@@ -0,0 +1,150 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from Metrics import AUDIO_FILES_COLLECTED
+from constants import AUDIO_GC_INTERVAL, AUDIO_STORE_MAX_AGE, AUDIO_STORE_MAX_BYTES, AUDIO_STORE_MIN_AGE
+
+# Shard directories are the first two hex digits of the file name's hash
+SHARD_PATTERN = re.compile(r'^[0-9a-f]{2}$')
+
+
+class AudioStore:
+    """
+    Call audio on disk, spread over 256 shard directories so none of them grows huge.
+
+    Files are addressed by their path relative to the store root ("3f/call_x.mp3"),
+    which is what goes into the TwiML and /audio URLs. A call holds a reference on its
+    file while it is active; a background sweep deletes unreferenced files once they are
+    older than `max_age`, and the oldest ones first while the store is over `max_bytes`.
+    Files younger than `min_age` are always kept, since calls placed by other worker
+    processes hold their references elsewhere. The TTS chunk cache is not in a shard
+    directory and is never collected.
+    """
+
+    def __init__(self, root, max_bytes=AUDIO_STORE_MAX_BYTES, max_age=AUDIO_STORE_MAX_AGE,
+                 min_age=AUDIO_STORE_MIN_AGE):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.min_age = min_age
+        self._refs = {}
+        self._lock = threading.Lock()
+        self._gc_thread = None
+
+    def relative_path(self, filename):
+        shard = hashlib.sha1(filename.encode('utf-8')).hexdigest()[:2]
+        return f"{shard}/{filename}"
+
+    def new_path(self, filename):
+        """Reserve a location for a new file; returns (relative path, absolute path)"""
+        relative = self.relative_path(filename)
+        path = os.path.join(self.root, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return relative, path
+
+    def resolve(self, relative):
+        """Absolute path for a relative path from a URL, refusing anything outside the store"""
+        root = os.path.realpath(self.root)
+        path = os.path.realpath(os.path.join(root, relative))
+        if not path.startswith(root + os.sep):
+            raise ValueError(f"Audio path outside the store: {relative}")
+        return path
+
+    def is_ready(self, relative):
+        """True once a file has been completely written (writers rename into place)"""
+        return not relative.endswith('.tmp') and os.path.isfile(self.resolve(relative))
+
+    def acquire(self, relative):
+        with self._lock:
+            self._refs[relative] = self._refs.get(relative, 0) + 1
+
+    def release(self, relative):
+        with self._lock:
+            count = self._refs.get(relative, 0) - 1
+            if count > 0:
+                self._refs[relative] = count
+            else:
+                self._refs.pop(relative, None)
+
+    def _scan(self):
+        """(mtime, size, relative, path) for every collectable file, oldest first"""
+        files = []
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    # Unsharded files left over from before the store existed
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.name, entry.path))
+                elif entry.is_dir() and SHARD_PATTERN.match(entry.name):
+                    with os.scandir(entry.path) as shard:
+                        for item in shard:
+                            if item.is_file():
+                                stat = item.stat()
+                                files.append((stat.st_mtime, stat.st_size, f"{entry.name}/{item.name}", item.path))
+        files.sort()
+        return files
+
+    def collect(self):
+        """Delete unreferenced files past the age or size limit; returns (files, bytes) removed"""
+        if not os.path.isdir(self.root):
+            return 0, 0
+        now = time.time()
+        files = self._scan()
+        total = sum(size for _, size, _, _ in files)
+        with self._lock:
+            referenced = set(self._refs)
+
+        removed = freed = 0
+        for mtime, size, relative, path in files:
+            age = now - mtime
+            if age < self.min_age:
+                # Sorted oldest first, so everything after this is younger too
+                break
+            if relative in referenced or (age <= self.max_age and total <= self.max_bytes):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.error(f"Could not remove audio file {path}: {e}")
+                continue
+            total -= size
+            removed += 1
+            freed += size
+
+        if removed:
+            AUDIO_FILES_COLLECTED.inc(removed)
+            logging.info(f"Audio GC removed {removed} files ({freed / 1e6:.1f} MB), {total / 1e6:.1f} MB remain")
+        return removed, freed
+
+    def start_gc(self, interval=AUDIO_GC_INTERVAL):
+        if self._gc_thread is not None:
+            return
+
+        def run():
+            while True:
+                try:
+                    self.collect()
+                except Exception as e:
+                    logging.error(f"Audio GC failed: {e}")
+                time.sleep(interval)
+
+        self._gc_thread = threading.Thread(target=run, daemon=True, name="audio-gc")
+        self._gc_thread.start()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_audio_store(root):
+    """The process-wide store for an audio directory, so references are shared"""
+    with _stores_lock:
+        store = _stores.get(root)
+        if store is None:
+            store = _stores[root] = AudioStore(root)
+        return store
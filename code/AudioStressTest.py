@@ -0,0 +1,171 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import wave
+from queue import Empty, Queue
+from urllib.parse import parse_qs, urlsplit
+from CallStatusBoard import status_board
+from FakeTTS import FakeTTS
+from TwilioCallBot import TwilioCallBot
+
+
+class _StubCall:
+    def __init__(self, sid):
+        self.sid = sid
+
+
+class _StubCalls:
+    """calls.create/stream stand-in: hands out SIDs and passes each TwiML URL to the reader"""
+
+    def __init__(self, fetched):
+        self.fetched = fetched
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def create(self, url, **kwargs):
+        with self._lock:
+            self._count += 1
+            sid = f"CA{self._count:032d}"
+        # Twilio may fetch the TwiML the moment calls.create returns
+        self.fetched.put(parse_qs(urlsplit(url).query)['audio'][0])
+        return _StubCall(sid)
+
+    def stream(self, **kwargs):
+        return []
+
+
+class _StubClient:
+    def __init__(self, fetched):
+        self.calls = _StubCalls(fetched)
+
+
+class _StressBot(TwilioCallBot):
+    def __init__(self, tts, audio_dir, fetched):
+        self._fetched = fetched
+        super().__init__('AC-stress', 'stress', '+15005550006', tts, audio_dir)
+
+    def _create_client(self, account_sid, auth_token):
+        return _StubClient(self._fetched)
+
+
+class AudioStressTest:
+    """
+    Concurrency check for call audio publishing.
+
+    Worker threads run real TwilioCallBot.make_call with FakeTTS and a stubbed Twilio
+    client. A reader thread plays Twilio's part: the moment a call is created it checks
+    the audio named in the TwiML URL with AudioStore.is_ready, like /twiml and /audio
+    do, and parses it. Any missing, truncated or unparseable file is a failure, as is a
+    .tmp file left in the store afterwards.
+    """
+
+    def __init__(self, calls, threads, script="This is a stress test of call audio publishing."):
+        self.calls = calls
+        self.threads = threads
+        self.script = script
+        self.not_ready = 0
+        self.invalid = 0
+        self.read = 0
+        self.call_errors = 0
+
+    def _check(self, store, relative):
+        if not store.is_ready(relative):
+            self.not_ready += 1
+            return
+        with open(store.resolve(relative), 'rb') as f:
+            data = f.read()
+        try:
+            with wave.open(io.BytesIO(data), 'rb') as reader:
+                expected = reader.getnframes() * reader.getnchannels() * reader.getsampwidth()
+                if len(reader.readframes(reader.getnframes())) != expected:
+                    self.invalid += 1
+        except (wave.Error, EOFError):
+            self.invalid += 1
+        self.read += 1
+
+    def run(self):
+        audio_dir = tempfile.mkdtemp(prefix="audio_stress_")
+        fetched = Queue()
+        try:
+            # Keep the chunk cache in the temporary directory too, out of the working directory
+            tts = FakeTTS(audio_dir, latency=0, cache_dir=os.path.join(audio_dir, 'tts_cache'))
+            tts.initialize()
+            bot = _StressBot(tts, audio_dir, fetched)
+            done = threading.Event()
+
+            def reader():
+                while not (done.is_set() and fetched.empty()):
+                    try:
+                        relative = fetched.get(timeout=0.1)
+                    except Empty:
+                        continue
+                    self._check(bot.audio_store, relative)
+
+            reader_thread = threading.Thread(target=reader, daemon=True)
+            reader_thread.start()
+
+            remaining = iter(range(self.calls))
+            lock = threading.Lock()
+
+            def worker():
+                while True:
+                    with lock:
+                        index = next(remaining, None)
+                    if index is None:
+                        return
+                    try:
+                        sid = bot.make_call(f"555{index:07d}", self.script)
+                        status_board.forget(sid)
+                        bot.release_audio(sid)
+                    except Exception:
+                        self.call_errors += 1
+
+            start = time.monotonic()
+            workers = [threading.Thread(target=worker) for _ in range(self.threads)]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            elapsed = time.monotonic() - start
+            done.set()
+            reader_thread.join()
+
+            leftover = [name for _, _, files in os.walk(audio_dir) for name in files if name.endswith('.tmp')]
+            published = sum(1 for _, _, files in os.walk(audio_dir) for name in files if name.startswith('call_'))
+            return {
+                'calls': self.calls,
+                'threads': self.threads,
+                'elapsed': elapsed,
+                'calls_per_second': self.calls / elapsed if elapsed else 0.0,
+                'files': published,
+                'read': self.read,
+                'not_ready': self.not_ready,
+                'invalid': self.invalid,
+                'call_errors': self.call_errors,
+                'leftover_tmp': len(leftover),
+            }
+        finally:
+            shutil.rmtree(audio_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Stress-test concurrent call audio writes against readers")
+    parser.add_argument("--calls", type=int, default=3200)
+    parser.add_argument("--threads", type=int, default=32)
+    args = parser.parse_args()
+
+    result = AudioStressTest(args.calls, args.threads).run()
+    print(f"{result['calls']} calls on {result['threads']} threads in {result['elapsed']:.2f}s "
+          f"({result['calls_per_second']:.0f} calls/s), {result['files']} files")
+    print(f"Read {result['read']}: {result['not_ready']} not ready, {result['invalid']} truncated or invalid, "
+          f"{result['leftover_tmp']} leftover .tmp files, {result['call_errors']} call errors")
+    failed = (result['not_ready'] or result['invalid'] or result['leftover_tmp'] or result['call_errors']
+              or result['files'] != result['calls'])
+    print("FAIL" if failed else "OK")
+    sys.exit(1 if failed else 0)
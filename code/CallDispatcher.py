@@ -0,0 +1,266 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Queue
+from CallStatusBoard import FINAL_STATUSES
+from CallTrace import tracer
+from StructuredLogging import bind_context, log_context
+from Metrics import CALLS_FINISHED, CALLS_IN_FLIGHT, CANCEL_LATENCY
+from constants import CANCEL_MAX_PARALLEL, RETRY_FILE, STATUS_WAIT_TIMEOUT, SUCCESS_FILE
+
+class ResultFileWriter:
+    """Appends call results to success.txt / retries.txt"""
+
+    def __init__(self, success_file=SUCCESS_FILE, retry_file=RETRY_FILE):
+        self.success_file = success_file
+        self.retry_file = retry_file
+        self._lock = threading.Lock()
+
+    def record(self, number, call_sid, status, duration=None, reason=None):
+        path = self.success_file if status == 'completed' else self.retry_file
+        with self._lock:
+            with open(path, 'a') as f:
+                # retries.txt has always carried the failure reason in the status column
+                f.write(f"{number},{call_sid},{reason or status}\n")
+
+
+class DialRateLimiter:
+    """Spaces call creation to at most `calls_per_second` (None means unlimited)"""
+
+    def __init__(self, calls_per_second=None):
+        self.interval = 1.0 / calls_per_second if calls_per_second else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, now):
+        """Book the next dial slot and return how long to wait for it"""
+        if not self.interval:
+            return 0.0
+        with self._lock:
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        return slot - now
+
+
+class NumberQueue:
+    """In-memory number source for a campaign run by a single process"""
+
+    def __init__(self, numbers):
+        self._queue = Queue()
+        for number in numbers:
+            self._queue.put(number)
+
+    def take(self):
+        try:
+            return self._queue.get_nowait()
+        except Empty:
+            return None
+
+    def task_done(self, number):
+        self._queue.task_done()
+
+    def empty(self):
+        return self._queue.empty()
+
+    def cancel(self):
+        pass
+
+
+class CallDispatcher:
+    """
+    Dialing policy for one campaign: which number goes next, pacing, and what happens
+    when a call starts, finishes or fails.
+
+    `process_numbers` is the threaded driver. The simulator runs it too, with a
+    simulated bot and a virtual `clock` and `wait`, so dry runs and real campaigns share
+    one implementation.
+    """
+
+    def __init__(self, bot, numbers, script_text, progress, results=None, calls_per_second=None, live=True,
+                 campaign_id=None, source=None, variants=None, clock=time.monotonic,
+                 wait=threading.Event.wait):
+        self.bot = bot
+        self.campaign_id = campaign_id
+        self.script_text = script_text
+        self.progress = progress
+        self.results = results or ResultFileWriter()
+        self.rate_limiter = DialRateLimiter(calls_per_second)
+        # Simulated campaigns must not touch the process metrics or the call tracer
+        self.live = live
+        # Where numbers come from: an in-memory queue, or e.g. leases on a shared campaign store
+        self.source = source or NumberQueue(numbers)
+        # Optional A/B variants; each number gets its variant's script and voice
+        self.variants = variants
+        self.threads = []
+        # Time source and event.wait(timeout) equivalent for pacing
+        self.clock = clock
+        self._wait = wait
+        # Set on abort so sleeping workers wake up instead of finishing their poll interval
+        self._cancelled = threading.Event()
+        self._hung_up = set()
+        self._hang_up_lock = threading.Lock()
+        self.cancel_started = None
+        self.cancel_latency = None
+        self._workers_left = 0
+        self._workers_lock = threading.Lock()
+
+    # --- Per-call hooks ----------------------------------------------------
+
+    def next_number(self):
+        """The next number to dial, or None when the campaign is drained or cancelled"""
+        if self.progress.cancel_requested:
+            return None
+        return self.source.take()
+
+    def dial_delay(self, now):
+        return self.rate_limiter.reserve(now)
+
+    def call_started(self, number):
+        self.progress.call_started()
+        if self.live:
+            CALLS_IN_FLIGHT.inc()
+
+    def call_placed(self, number, call_sid):
+        self.progress.call_placed(number, call_sid)
+
+    def call_finished(self, number, call_sid, status, duration=None):
+        if self.live:
+            # The status callback may not have landed yet, so close the trace here
+            tracer.mark_status(call_sid, status)
+            tracer.finish_sid(call_sid)
+            CALLS_FINISHED.labels(status).inc()
+            CALLS_IN_FLIGHT.dec()
+            self.bot.release_audio(call_sid)
+        self.results.record(number, call_sid, status, duration)
+        if self.variants:
+            self.variants.record(number, status, duration)
+        self.progress.call_finished(number, status == 'completed', duration)
+
+    def call_failed(self, number, marker, reason, status):
+        """
+        A call that never got going; `marker` takes the CallSid's place in the results.
+        `status` is one of a few fixed outcomes and `reason` free text, e.g. an exception message.
+        """
+        if self.live:
+            CALLS_FINISHED.labels(status).inc()
+            CALLS_IN_FLIGHT.dec()
+        self.results.record(number, marker, status, reason=reason)
+        if self.variants:
+            self.variants.record(number, status)
+        self.progress.call_finished(number, False)
+
+    # --- Threaded driver ----------------------------------------------------
+
+    def wait_for_final_status(self, call_sid):
+        board = self.bot.status_board
+        try:
+            while True:
+                status = board.wait(call_sid, STATUS_WAIT_TIMEOUT)
+                if status in FINAL_STATUSES:
+                    return status
+                if self._cancelled.is_set():
+                    # Calls placed after the bulk cancel took its snapshot are hung up here
+                    self._hang_up(call_sid)
+        finally:
+            board.forget(call_sid)
+
+    def _claim_hang_up(self, call_sid):
+        with self._hang_up_lock:
+            if call_sid in self._hung_up:
+                return False
+            self._hung_up.add(call_sid)
+            return True
+
+    def _hang_up(self, call_sid):
+        if self._claim_hang_up(call_sid):
+            self.bot.cancel_call(call_sid)
+
+    def cancel(self, max_parallel=CANCEL_MAX_PARALLEL):
+        """
+        Abort the campaign: stop dialing and hang up every active call with at most
+        `max_parallel` requests in flight. Returns the number of calls Twilio accepted
+        the hang-up for; `cancel_latency` is set once the workers have drained.
+        """
+        self.cancel_started = time.monotonic()
+        self.progress.request_cancel()
+        self.source.cancel()
+        # Claim the snapshot before waking the workers so each call gets exactly one request
+        call_sids = [sid for sid in self.progress.active_sids() if self._claim_hang_up(sid)]
+        self._cancelled.set()
+        if not call_sids:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=min(max_parallel, len(call_sids)),
+                                thread_name_prefix="cancel") as pool:
+            ended = sum(pool.map(self.bot.cancel_call, call_sids))
+        logging.info(f"Hung up {ended}/{len(call_sids)} active calls in "
+                     f"{time.monotonic() - self.cancel_started:.2f}s")
+        return ended
+
+    def _worker_exited(self):
+        with self._workers_lock:
+            self._workers_left -= 1
+            last = self._workers_left == 0
+        if last and self.cancel_started is not None:
+            self.cancel_latency = time.monotonic() - self.cancel_started
+            if self.live:
+                CANCEL_LATENCY.observe(self.cancel_latency)
+            logging.info(f"Campaign drained {self.cancel_latency:.2f}s after cancel")
+
+    def process_number(self, number):
+        # Update in_progress count
+        self.call_started(number)
+
+        try:
+            delay = self.dial_delay(self.clock())
+            if delay and self._wait(self._cancelled, delay):
+                self.call_failed(number, 'CANCELLED', 'cancelled_before_dial', 'canceled')
+                return
+
+            if self.variants:
+                variant = self.variants.assign(number)
+                call_sid = self.bot.make_call(number, variant.script, variant.voice_id)
+            else:
+                call_sid = self.bot.make_call(number, self.script_text)
+            if call_sid:
+                bind_context(call_sid=call_sid)
+                # Add to active calls
+                self.call_placed(number, call_sid)
+                placed_at = self.clock()
+                status = self.bot.machine_detector.outcome(call_sid, self.wait_for_final_status(call_sid))
+                self.call_finished(number, call_sid, status, self.clock() - placed_at)
+            else:
+                self.call_failed(number, 'NO_SID', 'failed_to_initiate', 'failed_to_initiate')
+        except Exception as e:
+            logging.error(f"Error processing number {number}: {e}")
+            self.call_failed(number, 'ERROR', str(e), 'error')
+        finally:
+            self.source.task_done(number)
+
+    def process_numbers(self):
+        while True:
+            try:
+                number = self.next_number()
+                if number is None:
+                    break
+
+                with log_context(campaign_id=self.campaign_id, number=number):
+                    self.process_number(number)
+            except Exception as e:
+                logging.error(f"Thread error: {e}")
+                break
+        self._worker_exited()
+
+    def start(self, thread_count):
+        self._workers_left = thread_count
+        for _ in range(thread_count):
+            thread = threading.Thread(target=self.process_numbers)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def is_finished(self):
+        # A cancelled campaign leaves numbers in the queue, so only wait for live calls then
+        drained = self.source.empty() or self.progress.cancel_requested
+        return drained and not any(t.is_alive() for t in self.threads)
@@ -0,0 +1,222 @@
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from Metrics import (CALL_STATUSES_RECONCILED, STATUS_EVENT_LAG, STATUS_EVENTS_DROPPED, STATUS_EVENTS_QUEUED,
+                     TWILIO_API_ERRORS, TWILIO_API_LATENCY)
+from constants import (RECONCILE_INTERVAL, RECONCILE_PAGE_SIZE, STATUS_BATCH_SIZE, STATUS_FLUSH_INTERVAL,
+                       STATUS_QUEUE_CAPACITY)
+
+FINAL_STATUSES = ('completed', 'failed', 'busy', 'no-answer', 'canceled')
+
+
+class CallStatusBoard:
+    """
+    Latest known status of every call this process is waiting on.
+    Status callbacks and the reconciler write to it; call workers block on a per-call
+    event until their call reaches a final status, instead of fetching it every second.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._statuses = {}
+        self._events = {}
+        self._placed_at = {}
+
+    def track(self, call_sid):
+        with self._lock:
+            self._events.setdefault(call_sid, threading.Event())
+            self._placed_at.setdefault(call_sid, time.time())
+
+    def update(self, call_sid, status):
+        self.update_many([(call_sid, status)])
+
+    def update_many(self, updates):
+        """Apply (call_sid, status) pairs in order under a single lock acquisition"""
+        finished = []
+        with self._lock:
+            for call_sid, status in updates:
+                event = self._events.get(call_sid)
+                # Callbacks can arrive out of order; a final status is never overwritten
+                if event is None or self._statuses.get(call_sid) in FINAL_STATUSES:
+                    continue
+                self._statuses[call_sid] = status
+                if status in FINAL_STATUSES:
+                    finished.append(event)
+        for event in finished:
+            event.set()
+
+    def status(self, call_sid):
+        return self._statuses.get(call_sid)
+
+    def wait(self, call_sid, timeout):
+        """Block until the call is final or `timeout` passes; returns the final status or None"""
+        event = self._events.get(call_sid)
+        if event is None or not event.wait(timeout):
+            return None
+        return self._statuses.get(call_sid)
+
+    def forget(self, call_sid):
+        with self._lock:
+            self._events.pop(call_sid, None)
+            self._statuses.pop(call_sid, None)
+            self._placed_at.pop(call_sid, None)
+
+    def outstanding(self):
+        """Tracked calls without a final status, and when the oldest of them was placed"""
+        with self._lock:
+            pending = {sid: placed for sid, placed in self._placed_at.items()
+                       if self._statuses.get(sid) not in FINAL_STATUSES}
+        return set(pending), min(pending.values(), default=None)
+
+
+class StatusReconciler:
+    """
+    Catches up on lost status callbacks in bulk. Every `interval` it lists the calls
+    made from the bot's number since the oldest outstanding call was placed, page by
+    page, and updates the board in one pass; N outstanding calls cost a few paged
+    requests instead of N fetches per second.
+
+    There is one per process. It uses the client and number of the bot that placed the
+    latest call, and its thread exits once no call is outstanding, so it keeps neither
+    a finished campaign's bot alive nor polling.
+    """
+
+    def __init__(self, board, interval=RECONCILE_INTERVAL, page_size=RECONCILE_PAGE_SIZE):
+        self.board = board
+        self.interval = interval
+        self.page_size = page_size
+        self.bot = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self, bot):
+        """Make sure a reconcile loop runs for calls placed by `bot`"""
+        with self._start_lock:
+            self.bot = bot
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="status-reconciler")
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._start_lock:
+                # Calls are tracked before start() is called, so nothing can be missed here
+                if not self.board.outstanding()[0]:
+                    self._thread = None
+                    self.bot = None
+                    return
+            try:
+                self.reconcile()
+            except Exception as e:
+                logging.error(f"Status reconciliation failed: {e}")
+
+    def reconcile(self):
+        outstanding, oldest = self.board.outstanding()
+        if not outstanding:
+            return 0
+
+        # StartTime has minute resolution on the API side, so leave some slack
+        since = datetime.fromtimestamp(oldest, timezone.utc) - timedelta(minutes=2)
+        bot = self.bot
+        if bot is None:
+            return 0
+        resolved = 0
+        api_start = time.monotonic()
+        try:
+            for call in bot.client.calls.stream(from_=bot.from_number, start_time_after=since,
+                                                page_size=self.page_size):
+                if call.sid in outstanding:
+                    outstanding.discard(call.sid)
+                    if call.status in FINAL_STATUSES:
+                        resolved += 1
+                    self.board.update(call.sid, call.status)
+                    if not outstanding:
+                        break
+        except Exception:
+            TWILIO_API_ERRORS.labels('list').inc()
+            raise
+        finally:
+            TWILIO_API_LATENCY.labels('list').observe(time.monotonic() - api_start)
+
+        if resolved:
+            CALL_STATUSES_RECONCILED.inc(resolved)
+            logging.info(f"Reconciled {resolved} call statuses from the calls list")
+        return resolved
+
+
+class StatusEventQueue:
+    """
+    Write-behind buffer between the /status-callback handler and the status board.
+
+    `put` only appends to a bounded in-memory ring and returns, so the handler never
+    waits on the board's lock or on whatever the consumer does with an event. A
+    background thread drains the ring in batches. When the ring is full new events are
+    dropped and counted; a dropped final status is later recovered by the reconciler.
+    """
+
+    def __init__(self, board, capacity=STATUS_QUEUE_CAPACITY, batch_size=STATUS_BATCH_SIZE,
+                 flush_interval=STATUS_FLUSH_INTERVAL):
+        self.board = board
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._ring = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def put(self, call_sid, status):
+        """Buffer one callback; returns False when it had to be dropped"""
+        with self._lock:
+            if len(self._ring) >= self.capacity:
+                STATUS_EVENTS_DROPPED.inc()
+                return False
+            self._ring.append((time.monotonic(), call_sid, status))
+        STATUS_EVENTS_QUEUED.inc()
+        if self._thread is None:
+            self.start()
+        if len(self._ring) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="status-events")
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                while self.flush():
+                    pass
+            except Exception as e:
+                logging.error(f"Applying status callbacks failed: {e}")
+
+    def flush(self):
+        """Apply up to one batch of buffered events; returns how many were applied"""
+        with self._lock:
+            count = min(len(self._ring), self.batch_size)
+            batch = [self._ring.popleft() for _ in range(count)]
+        if not batch:
+            return 0
+        STATUS_EVENTS_QUEUED.dec(count)
+        self.board.update_many([(call_sid, status) for _, call_sid, status in batch])
+        now = time.monotonic()
+        for received, _, _ in batch:
+            STATUS_EVENT_LAG.observe(now - received)
+        return count
+
+    def __len__(self):
+        return len(self._ring)
+
+
+status_board = CallStatusBoard()
+reconciler = StatusReconciler(status_board)
+status_events = StatusEventQueue(status_board)
@@ -0,0 +1,208 @@
+import json
+import logging
+import threading
+import time
+
+
+# Stage pairs that make up the spans we report. A span is only recorded when
+# both of its stages were marked on the trace.
+TRACE_SPANS = [
+    ('tts', 'tts_start', 'tts_done'),
+    ('file_write', 'tts_done', 'file_written'),
+    ('calls_create', 'api_start', 'api_done'),
+    ('queued_to_ringing', 'initiated', 'ringing'),
+    ('ringing_to_answered', 'ringing', 'answered'),
+    ('twiml_fetch', 'twiml_start', 'twiml_done'),
+    ('audio_fetch', 'audio_start', 'audio_done'),
+    ('answered_to_completed', 'answered', 'completed'),
+    ('total', 'tts_start', 'completed'),
+]
+
+# Twilio reports the answered state as 'in-progress'
+STATUS_STAGES = {
+    'queued': 'initiated',
+    'initiated': 'initiated',
+    'ringing': 'ringing',
+    'in-progress': 'answered',
+    'answered': 'answered',
+    'completed': 'completed',
+    'busy': 'completed',
+    'failed': 'completed',
+    'no-answer': 'completed',
+    'canceled': 'completed',
+}
+
+
+class LatencyHistogram:
+    """
+    Log-spaced latency histogram (1ms to ~10 minutes).
+    Recording is a bucket lookup and an increment, so it is cheap enough for the hot path.
+    """
+
+    BOUNDS = [0.001 * (1.25 ** i) for i in range(60)]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        # Binary search for the first bucket whose upper bound holds the value
+        lo, hi = 0, len(self.BOUNDS)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if seconds <= self.BOUNDS[mid]:
+                hi = mid
+            else:
+                lo = mid + 1
+        with self._lock:
+            self.counts[lo] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the given percentile (0-100)"""
+        with self._lock:
+            counts = list(self.counts)
+            count = self.count
+            maximum = self.max
+        if count == 0:
+            return 0.0
+        target = count * pct / 100.0
+        seen = 0
+        for i, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(self.BOUNDS[i], maximum) if i < len(self.BOUNDS) else maximum
+        return maximum
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+
+class CallTrace:
+    """Monotonic timestamps for each stage of a single call"""
+
+    __slots__ = ('number', 'call_sid', 'audio_file', 'stages')
+
+    def __init__(self, number):
+        self.number = number
+        self.call_sid = None
+        self.audio_file = None
+        self.stages = {}
+
+    def mark(self, stage):
+        # Keep the first timestamp; Twilio may retry webhooks for the same stage
+        if stage not in self.stages:
+            self.stages[stage] = time.monotonic()
+
+    def spans(self):
+        for name, start, end in TRACE_SPANS:
+            if start in self.stages and end in self.stages:
+                yield name, self.stages[end] - self.stages[start]
+
+
+class CallTracer:
+    """
+    Registry of in-flight call traces plus the per-campaign span histograms.
+    The bot thread that places a call owns its trace through a thread-local, while the
+    webhook handlers find it again by CallSid or audio filename.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._by_sid = {}
+        self._by_audio = {}
+        self.campaign = None
+        self.histograms = {name: LatencyHistogram() for name, _, _ in TRACE_SPANS}
+
+    def begin_campaign(self, campaign):
+        with self._lock:
+            self.campaign = campaign
+            self.histograms = {name: LatencyHistogram() for name, _, _ in TRACE_SPANS}
+
+    def start(self, number):
+        trace = CallTrace(number)
+        self._local.trace = trace
+        return trace
+
+    def current(self):
+        return getattr(self._local, 'trace', None)
+
+    def mark(self, stage):
+        """Mark a stage on the calling thread's trace, if there is one"""
+        trace = getattr(self._local, 'trace', None)
+        if trace is not None:
+            trace.mark(stage)
+
+    def bind_sid(self, trace, call_sid):
+        trace.call_sid = call_sid
+        with self._lock:
+            self._by_sid[call_sid] = trace
+
+    def bind_audio(self, trace, filename):
+        trace.audio_file = filename
+        with self._lock:
+            self._by_audio[filename] = trace
+
+    def mark_sid(self, call_sid, stage):
+        trace = self._by_sid.get(call_sid)
+        if trace is not None:
+            trace.mark(stage)
+
+    def mark_status(self, call_sid, status):
+        stage = STATUS_STAGES.get(status)
+        if stage:
+            self.mark_sid(call_sid, stage)
+
+    def mark_audio(self, filename, stage):
+        trace = self._by_audio.get(filename)
+        if trace is not None:
+            trace.mark(stage)
+
+    def finish(self, trace):
+        """Fold a finished trace into the campaign histograms and forget it"""
+        if trace is None:
+            return
+        with self._lock:
+            if trace.call_sid:
+                self._by_sid.pop(trace.call_sid, None)
+            if trace.audio_file:
+                self._by_audio.pop(trace.audio_file, None)
+            histograms = self.histograms
+        for name, seconds in trace.spans():
+            histogram = histograms.get(name)
+            if histogram is not None:
+                histogram.observe(seconds)
+        if getattr(self._local, 'trace', None) is trace:
+            self._local.trace = None
+
+    def finish_sid(self, call_sid):
+        self.finish(self._by_sid.get(call_sid))
+
+    def summary(self):
+        return {name: histogram.summary() for name, histogram in self.histograms.items()}
+
+    def dump(self, path):
+        """Write the campaign's span percentiles to a JSON file"""
+        try:
+            with open(path, 'w') as f:
+                json.dump({'campaign': self.campaign, 'spans': self.summary()}, f, indent=4)
+            logging.info(f"Latency report for campaign {self.campaign} written to {path}")
+        except Exception as e:
+            logging.error(f"Error writing latency report {path}: {e}")
+
+
+tracer = CallTracer()
@@ -0,0 +1,216 @@
+import csv
+import json
+import logging
+import os
+import threading
+import time
+from CallDispatcher import ResultFileWriter
+from DialScheduler import area_code
+from Metrics import Histogram
+from constants import RESULTS_DIR, RESULTS_SUMMARY_INTERVAL, RETRY_FILE, SUCCESS_FILE
+
+RESULT_FIELDS = ('finished_at', 'number', 'call_sid', 'status', 'duration', 'reason')
+EXPORT_FORMATS = ('csv', 'jsonl', 'columnar')
+# Rows per batch when writing columnar output; memory use is bounded by this
+COLUMNAR_BATCH_ROWS = 65536
+
+
+class CampaignAggregates:
+    """Report numbers for one campaign, updated per result so nothing is ever rescanned"""
+
+    def __init__(self, campaign_id):
+        self.campaign_id = campaign_id
+        self.total = 0
+        self.statuses = {}
+        self.by_hour = {}
+        self.by_area_code = {}
+        self.durations = Histogram()
+
+    def add(self, finished_at, number, status, duration=None):
+        self.total += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        hour = time.strftime("%Y-%m-%d %H:00", time.localtime(finished_at))
+        hour_counts = self.by_hour.setdefault(hour, {})
+        hour_counts[status] = hour_counts.get(status, 0) + 1
+        area = self.by_area_code.setdefault(area_code(number) or 'unknown', {'calls': 0, 'completed': 0})
+        area['calls'] += 1
+        if status == 'completed':
+            area['completed'] += 1
+            if duration is not None:
+                self.durations.observe(duration)
+
+    def to_dict(self):
+        return {
+            'campaign': self.campaign_id,
+            'total': self.total,
+            'statuses': self.statuses,
+            'by_hour': self.by_hour,
+            'by_area_code': self.by_area_code,
+            'answered_duration': self.durations.summary(),
+        }
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=4)
+        os.replace(tmp_path, path)
+
+
+class ResultRecorder:
+    """
+    Result sink for a campaign. Besides the usual success/retry files it appends every
+    result to results/<campaign>.csv and keeps the campaign's aggregates current,
+    saving them to results/<campaign>_summary.json every few seconds and on close.
+    """
+
+    def __init__(self, campaign_id, results_dir=RESULTS_DIR, success_file=SUCCESS_FILE, retry_file=RETRY_FILE,
+                 summary_interval=RESULTS_SUMMARY_INTERVAL):
+        os.makedirs(results_dir, exist_ok=True)
+        self.files = ResultFileWriter(success_file, retry_file)
+        self.log_path = os.path.join(results_dir, f"{campaign_id}.csv")
+        self.summary_path = os.path.join(results_dir, f"{campaign_id}_summary.json")
+        self.aggregates = CampaignAggregates(campaign_id)
+        self.summary_interval = summary_interval
+        self._lock = threading.Lock()
+        self._last_saved = time.monotonic()
+
+        new_log = not os.path.exists(self.log_path)
+        self._log = open(self.log_path, 'a', newline='')
+        self._writer = csv.writer(self._log)
+        if new_log:
+            self._writer.writerow(RESULT_FIELDS)
+
+    def record(self, number, call_sid, status, duration=None, reason=None):
+        self.files.record(number, call_sid, status, duration, reason)
+        finished_at = time.time()
+        with self._lock:
+            self._writer.writerow((f"{finished_at:.3f}", number, call_sid, status,
+                                   "" if duration is None else f"{duration:.3f}", reason or ""))
+            self.aggregates.add(finished_at, number, status, duration)
+            if time.monotonic() - self._last_saved >= self.summary_interval:
+                self._save()
+
+    def _save(self):
+        self._log.flush()
+        self.aggregates.save(self.summary_path)
+        self._last_saved = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            self._save()
+            self._log.close()
+        logging.info(f"Campaign results in {self.log_path}, summary in {self.summary_path}")
+
+
+def iter_results(path):
+    """Stream a campaign's result log as dicts, one row at a time"""
+    with open(path, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            row['finished_at'] = float(row['finished_at'])
+            row['duration'] = float(row['duration']) if row['duration'] else None
+            # Logs written before the reason column existed
+            row['reason'] = row.get('reason') or None
+            yield row
+
+
+def export_csv(rows, out_path):
+    with open(out_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def export_jsonl(rows, out_path):
+    with open(out_path, 'w') as f:
+        count = 0
+        for row in rows:
+            f.write(json.dumps(row))
+            f.write("\n")
+            count += 1
+    return count
+
+
+def _batches(rows, size):
+    batch = {field: [] for field in RESULT_FIELDS}
+    filled = 0
+    for row in rows:
+        for field in RESULT_FIELDS:
+            batch[field].append(row[field])
+        filled += 1
+        if filled == size:
+            yield batch
+            batch = {field: [] for field in RESULT_FIELDS}
+            filled = 0
+    if filled:
+        yield batch
+
+
+def export_columnar(rows, out_path, batch_rows=COLUMNAR_BATCH_ROWS):
+    """
+    Parquet when pyarrow is installed, written one row group per batch. Without it,
+    falls back to column-chunked JSON Lines: one object of column arrays per batch.
+    """
+    count = 0
+    try:
+        import pyarrow as pa # type: ignore
+        import pyarrow.parquet as pq # type: ignore
+    except ImportError:
+        with open(out_path, 'w') as f:
+            for batch in _batches(rows, batch_rows):
+                f.write(json.dumps(batch))
+                f.write("\n")
+                count += len(batch['number'])
+        return count
+
+    schema = pa.schema([
+        ('finished_at', pa.float64()),
+        ('number', pa.string()),
+        ('call_sid', pa.string()),
+        ('status', pa.string()),
+        ('duration', pa.float64()),
+        ('reason', pa.string()),
+    ])
+    with pq.ParquetWriter(out_path, schema) as writer:
+        for batch in _batches(rows, batch_rows):
+            writer.write_table(pa.table(batch, schema=schema))
+            count += len(batch['number'])
+    return count
+
+
+EXPORTERS = {'csv': export_csv, 'jsonl': export_jsonl, 'columnar': export_columnar}
+
+
+def export_results(campaign_id, fmt, out_path, results_dir=RESULTS_DIR):
+    """Stream a campaign's results into `fmt`; memory stays constant however many rows there are"""
+    if fmt not in EXPORTERS:
+        raise ValueError(f"Unknown export format {fmt}; use one of {', '.join(EXPORT_FORMATS)}")
+    count = EXPORTERS[fmt](iter_results(os.path.join(results_dir, f"{campaign_id}.csv")), out_path)
+    logging.info(f"Exported {count} results for campaign {campaign_id} to {out_path}")
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Campaign result summaries and exports")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    summary = commands.add_parser("summary", help="Print a campaign's aggregates")
+    summary.add_argument("campaign_id")
+
+    export = commands.add_parser("export", help="Export a campaign's results")
+    export.add_argument("campaign_id")
+    export.add_argument("--format", choices=EXPORT_FORMATS, default='csv')
+    export.add_argument("--out", required=True)
+
+    args = parser.parse_args()
+    if args.command == "summary":
+        with open(os.path.join(args.results_dir, f"{args.campaign_id}_summary.json"), 'r') as f:
+            print(f.read())
+    else:
+        print(export_results(args.campaign_id, args.format, args.out, args.results_dir))
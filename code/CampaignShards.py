@@ -0,0 +1,454 @@
+import logging
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+from collections import deque
+from urllib.parse import quote
+import ConfigHelper
+from AudioStore import get_audio_store
+from CallDispatcher import CallDispatcher
+from ProgressTracker import ProgressTracker
+from constants import AUDIO_DIR, RETRY_FILE, SUCCESS_FILE, SHARD_DB_FILE, SHARD_LEASE_SECONDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    id TEXT PRIMARY KEY,
+    script TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    cancelled INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS numbers (
+    campaign_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    number TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    call_sid TEXT,
+    status TEXT,
+    finished_at REAL,
+    PRIMARY KEY (campaign_id, position)
+);
+CREATE INDEX IF NOT EXISTS numbers_by_state ON numbers (campaign_id, state, position);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    campaign_id TEXT NOT NULL,
+    host TEXT,
+    pid INTEGER,
+    threads INTEGER,
+    heartbeat REAL
+);
+"""
+
+
+class CampaignStore:
+    """
+    Campaign state shared by every worker process, in one SQLite database.
+
+    Numbers are handed out as time-limited leases: a worker claims a batch, renews its
+    leases while it is alive, and marks each number done with its result. If a worker
+    dies its leases expire and the numbers go to whoever claims next, so delivery is
+    at-least-once.
+
+    Workers run on the host of the webhook app. Twilio fetches each call's TwiML and
+    audio from the configured webhook_url, so the audio a worker writes has to be in the
+    directory that app serves; check_webhook_host refuses to start a worker otherwise.
+    Status callbacks reach the app's process rather than the worker's, so workers learn
+    how their calls ended from the status reconciler.
+    """
+
+    def __init__(self, path=SHARD_DB_FILE):
+        self.path = path
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit; writes that must be atomic open their own transaction
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def create_campaign(self, numbers, script, campaign_id=None):
+        campaign_id = campaign_id or time.strftime("%Y%m%d_%H%M%S")
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT INTO campaigns (id, script, created_at) VALUES (?, ?, ?)",
+                         (campaign_id, script, time.time()))
+            conn.executemany("INSERT INTO numbers (campaign_id, position, number) VALUES (?, ?, ?)",
+                             ((campaign_id, position, number) for position, number in enumerate(numbers)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return campaign_id
+
+    def campaign(self, campaign_id):
+        row = self._connect().execute("SELECT script, cancelled FROM campaigns WHERE id = ?",
+                                      (campaign_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"Unknown campaign: {campaign_id}")
+        return {'id': campaign_id, 'script': row[0], 'cancelled': bool(row[1])}
+
+    def register_worker(self, campaign_id, worker_id, threads):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO workers (worker_id, campaign_id, host, pid, threads, heartbeat) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (worker_id, campaign_id, socket.gethostname(), os.getpid(), threads, time.time()))
+
+    def claim(self, campaign_id, worker_id, limit, lease_seconds=SHARD_LEASE_SECONDS):
+        """Lease up to `limit` numbers: pending ones first, then any whose lease has expired"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT position, number FROM numbers WHERE campaign_id = ? AND state = 'pending' "
+                "ORDER BY position LIMIT ?", (campaign_id, limit)).fetchall()
+            if len(rows) < limit:
+                rows += conn.execute(
+                    "SELECT position, number FROM numbers WHERE campaign_id = ? AND state = 'leased' "
+                    "AND lease_expires < ? ORDER BY position LIMIT ?",
+                    (campaign_id, now, limit - len(rows))).fetchall()
+            conn.executemany(
+                "UPDATE numbers SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE campaign_id = ? AND position = ?",
+                ((worker_id, now + lease_seconds, campaign_id, position) for position, _ in rows))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def heartbeat(self, campaign_id, worker_id, lease_seconds=SHARD_LEASE_SECONDS):
+        """Extend this worker's leases; returns True if the campaign was cancelled"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("UPDATE numbers SET lease_expires = ? WHERE campaign_id = ? AND worker = ? AND state = 'leased'",
+                     (now + lease_seconds, campaign_id, worker_id))
+        conn.execute("UPDATE workers SET heartbeat = ? WHERE worker_id = ?", (now, worker_id))
+        return self.campaign(campaign_id)['cancelled']
+
+    def complete(self, campaign_id, worker_id, position, call_sid, status):
+        self._connect().execute(
+            "UPDATE numbers SET state = 'done', call_sid = ?, status = ?, finished_at = ?, lease_expires = NULL "
+            "WHERE campaign_id = ? AND position = ? AND worker = ?",
+            (call_sid, status, time.time(), campaign_id, position, worker_id))
+
+    def release(self, campaign_id, worker_id, positions):
+        """Give back leased numbers this worker will not dial"""
+        self._connect().executemany(
+            "UPDATE numbers SET state = 'pending', worker = NULL, lease_expires = NULL "
+            "WHERE campaign_id = ? AND position = ? AND worker = ? AND state = 'leased'",
+            ((campaign_id, position, worker_id) for position in positions))
+
+    def cancel(self, campaign_id):
+        self._connect().execute("UPDATE campaigns SET cancelled = 1 WHERE id = ?", (campaign_id,))
+
+    def has_work(self, campaign_id):
+        row = self._connect().execute(
+            "SELECT 1 FROM numbers WHERE campaign_id = ? AND state != 'done' LIMIT 1", (campaign_id,)).fetchone()
+        return row is not None
+
+    def progress(self, campaign_id):
+        """Aggregated progress across all workers"""
+        conn = self._connect()
+        states = dict(conn.execute(
+            "SELECT state, COUNT(*) FROM numbers WHERE campaign_id = ? GROUP BY state", (campaign_id,)).fetchall())
+        statuses = dict(conn.execute(
+            "SELECT status, COUNT(*) FROM numbers WHERE campaign_id = ? AND state = 'done' GROUP BY status",
+            (campaign_id,)).fetchall())
+        live_since = time.time() - SHARD_LEASE_SECONDS
+        workers = conn.execute(
+            "SELECT COUNT(*) FROM workers WHERE campaign_id = ? AND heartbeat >= ?",
+            (campaign_id, live_since)).fetchone()[0]
+        return {
+            'campaign_id': campaign_id,
+            'total': sum(states.values()),
+            'pending': states.get('pending', 0),
+            'leased': states.get('leased', 0),
+            'done': states.get('done', 0),
+            'completed': statuses.get('completed', 0),
+            'failed': states.get('done', 0) - statuses.get('completed', 0),
+            'statuses': statuses,
+            'live_workers': workers,
+        }
+
+    def export_results(self, campaign_id, success_file=SUCCESS_FILE, retry_file=RETRY_FILE):
+        """Write the campaign's results to success.txt / retries.txt, like a single-process run"""
+        rows = self._connect().execute(
+            "SELECT number, call_sid, status FROM numbers WHERE campaign_id = ? AND state = 'done' ORDER BY position",
+            (campaign_id,))
+        with open(success_file, 'a') as success, open(retry_file, 'a') as retry:
+            for number, call_sid, status in rows:
+                (success if status == 'completed' else retry).write(f"{number},{call_sid},{status}\n")
+
+
+class LeasedNumbers:
+    """CallDispatcher number source that claims batches of leases from a CampaignStore"""
+
+    def __init__(self, store, campaign_id, worker_id, batch_size):
+        self.store = store
+        self.campaign_id = campaign_id
+        self.worker_id = worker_id
+        self.batch_size = batch_size
+        self._buffer = deque()
+        # number -> positions taken but not yet finished (a list may hold duplicates)
+        self._positions = {}
+        self._lock = threading.Lock()
+        self._exhausted = False
+
+    def take(self):
+        with self._lock:
+            if not self._buffer and not self._exhausted:
+                rows = self.store.claim(self.campaign_id, self.worker_id, self.batch_size)
+                self._buffer.extend(rows)
+                self._exhausted = not rows
+            if not self._buffer:
+                return None
+            position, number = self._buffer.popleft()
+            self._positions.setdefault(number, deque()).append(position)
+            return number
+
+    def position_of(self, number):
+        with self._lock:
+            positions = self._positions.get(number)
+            return positions[0] if positions else None
+
+    def task_done(self, number):
+        with self._lock:
+            positions = self._positions.get(number)
+            if positions:
+                positions.popleft()
+                if not positions:
+                    del self._positions[number]
+
+    def empty(self):
+        return self._exhausted and not self._buffer
+
+    def reset(self):
+        self._exhausted = False
+
+    def cancel(self):
+        pass
+
+    def release_unstarted(self):
+        with self._lock:
+            positions = [position for position, _ in self._buffer]
+            self._buffer.clear()
+        self.store.release(self.campaign_id, self.worker_id, positions)
+
+
+class LeasedResults:
+    """Result sink that records outcomes in the shared store"""
+
+    def __init__(self, store, source):
+        self.store = store
+        self.source = source
+
+    def record(self, number, call_sid, status, duration=None, reason=None):
+        position = self.source.position_of(number)
+        if position is not None:
+            self.store.complete(self.source.campaign_id, self.source.worker_id, position, call_sid, status)
+
+
+class ShardWorker:
+    """One worker process: runs a CallDispatcher over leases from the shared store"""
+
+    def __init__(self, store, campaign_id, bot, thread_count, worker_id=None):
+        self.store = store
+        self.campaign_id = campaign_id
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        campaign = store.campaign(campaign_id)
+        self.source = LeasedNumbers(store, campaign_id, self.worker_id, batch_size=thread_count * 2)
+        self.progress = ProgressTracker(store.progress(campaign_id)['total'])
+        self.dispatcher = CallDispatcher(
+            bot, [], campaign['script'], self.progress,
+            results=LeasedResults(store, self.source),
+            calls_per_second=ConfigHelper.load_config().get('max_calls_per_second'),
+            campaign_id=campaign_id, source=self.source)
+        self.thread_count = thread_count
+        self._next_heartbeat = 0.0
+
+    def run(self):
+        self.store.register_worker(self.campaign_id, self.worker_id, self.thread_count)
+        logging.info(f"Worker {self.worker_id} joined campaign {self.campaign_id}")
+        while True:
+            self.source.reset()
+            self.dispatcher.start(self.thread_count)
+            self._wait_for_dispatcher()
+            if self.progress.cancel_requested or not self.store.has_work(self.campaign_id):
+                break
+            # Other workers still hold leases; stay around to pick them up if one of them dies
+            self._sleep_heartbeat(until_finished=False)
+            if self.progress.cancel_requested:
+                break
+        self.source.release_unstarted()
+        logging.info(f"Worker {self.worker_id} finished: {self.progress.completed} completed, "
+                     f"{self.progress.failed} failed")
+
+    def _wait_for_dispatcher(self):
+        while not self.dispatcher.is_finished():
+            self._sleep_heartbeat()
+
+    def _sleep_heartbeat(self, until_finished=True):
+        # Keep our leases alive and watch for a cancel issued from the coordinator
+        deadline = time.monotonic() + SHARD_LEASE_SECONDS / 3
+        while time.monotonic() < deadline and not (until_finished and self.dispatcher.is_finished()):
+            time.sleep(0.5)
+        if time.monotonic() >= self._next_heartbeat:
+            self._next_heartbeat = time.monotonic() + SHARD_LEASE_SECONDS / 3
+            if self.store.heartbeat(self.campaign_id, self.worker_id) and not self.progress.cancel_requested:
+                logging.info("Campaign cancelled; hanging up active calls")
+                self.dispatcher.cancel()
+
+
+def check_webhook_host(webhook_url, audio_dir=AUDIO_DIR, timeout=10):
+    """
+    Make sure the app behind `webhook_url` serves `audio_dir`, by publishing a probe file
+    there and downloading it through the webhook. Raises ValueError if it doesn't.
+    """
+    if not webhook_url:
+        raise ValueError("No webhook_url in config.json; start the webhook app first")
+    store = get_audio_store(audio_dir)
+    probe = uuid.uuid4().hex.encode('ascii')
+    relative, path = store.new_path(f"shard_probe_{probe.decode('ascii')}.txt")
+    with open(f"{path}.tmp", 'wb') as f:
+        f.write(probe)
+    os.replace(f"{path}.tmp", path)
+    try:
+        with urllib.request.urlopen(f"{webhook_url}/audio/{quote(relative)}", timeout=timeout) as response:
+            served = response.read()
+    except Exception as e:
+        raise ValueError(f"The webhook app at {webhook_url} does not serve {os.path.abspath(audio_dir)} ({e}); "
+                         f"run workers on the host of the webhook app") from e
+    finally:
+        os.remove(path)
+    if served != probe:
+        raise ValueError(f"The webhook app at {webhook_url} serves a different audio directory than "
+                         f"{os.path.abspath(audio_dir)}; run workers on the host of the webhook app")
+
+
+def build_bot(engine):
+    """A TwilioCallBot configured from config.json, like the GUI builds one"""
+    from TwilioCallBot import TwilioCallBot
+
+    config = ConfigHelper.load_config()
+    if engine == 'fake':
+        from FakeTTS import FakeTTS
+        tts = FakeTTS(AUDIO_DIR)
+        tts.initialize()
+    elif engine == 'offline':
+        from OfflineTTS import OfflineTTS
+        tts = OfflineTTS(AUDIO_DIR)
+        tts.initialize()
+    else:
+        from ElevenLabsTTS import ElevenLabsTTS
+        tts = ElevenLabsTTS(AUDIO_DIR)
+        if not tts.initialize(config.get('elevenlabs_api_key', '')):
+            raise ValueError("Could not initialize ElevenLabs; check elevenlabs_api_key in config.json")
+        if config.get('voice_id'):
+            tts.set_voice(config['voice_id'], config.get('voice_name'))
+    os.makedirs(AUDIO_DIR, exist_ok=True)
+    return TwilioCallBot(config['account_sid'], config['auth_token'], config['phone_number'], tts, AUDIO_DIR)
+
+
+def format_progress(progress):
+    return (f"[{progress['campaign_id']}] {progress['done']}/{progress['total']} done "
+            f"({progress['completed']} completed, {progress['failed']} failed), "
+            f"{progress['leased']} leased, {progress['pending']} pending, "
+            f"{progress['live_workers']} live workers")
+
+
+def run_coordinator(store, numbers, script, workers, threads, engine, max_restarts=None):
+    """Create the campaign, start local worker processes and report aggregated progress"""
+    restarts_left = workers * 3 if max_restarts is None else max_restarts
+    campaign_id = store.create_campaign(numbers, script)
+    logging.info(f"Campaign {campaign_id}: {len(numbers)} numbers across {workers} workers")
+    processes = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), 'worker', campaign_id,
+                          '--db', store.path, '--threads', str(threads), '--engine', engine])
+        for _ in range(workers)
+    ]
+    try:
+        while any(process.poll() is None for process in processes):
+            print(format_progress(store.progress(campaign_id)), flush=True)
+            time.sleep(2)
+            # Respawn workers that died while there is still work; their leases expire on their own
+            for i, process in enumerate(processes):
+                if process.poll() not in (None, 0) and restarts_left > 0 and store.has_work(campaign_id) \
+                        and not store.campaign(campaign_id)['cancelled']:
+                    restarts_left -= 1
+                    logging.warning(f"Worker exited with {process.returncode}; starting a replacement")
+                    processes[i] = subprocess.Popen(process.args)
+    except KeyboardInterrupt:
+        store.cancel(campaign_id)
+        for process in processes:
+            process.wait()
+    print(format_progress(store.progress(campaign_id)))
+    store.export_results(campaign_id)
+    return campaign_id
+
+
+if __name__ == "__main__":
+    import argparse
+    import re
+    from constants import NUMBER_REGEX
+    from StructuredLogging import log_pipeline
+
+    parser = argparse.ArgumentParser(description="Run one campaign across several worker processes on the webhook app's host")
+    parser.add_argument("--db", default=SHARD_DB_FILE, help="Shared campaign database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Create a campaign and run it with local worker processes")
+    run.add_argument("numbers_file")
+    run.add_argument("--script", required=True)
+    run.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    run.add_argument("--threads", type=int, default=5, help="Call threads per worker")
+    run.add_argument("--engine", choices=['elevenlabs', 'offline', 'fake'], default='elevenlabs')
+
+    worker = commands.add_parser("worker", help="Join an existing campaign from another process")
+    worker.add_argument("campaign_id")
+    worker.add_argument("--threads", type=int, default=5)
+    worker.add_argument("--engine", choices=['elevenlabs', 'offline', 'fake'], default='elevenlabs')
+
+    status = commands.add_parser("status", help="Show aggregated progress")
+    status.add_argument("campaign_id")
+
+    cancel = commands.add_parser("cancel", help="Cancel a campaign on every worker")
+    cancel.add_argument("campaign_id")
+
+    # Worker options come after the subcommand, so accept --db there too
+    for command in (run, worker, status, cancel):
+        command.add_argument("--db", default=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    log_pipeline.setup(level='INFO')
+    store = CampaignStore(args.db)
+    if args.command in ("run", "worker"):
+        try:
+            check_webhook_host(ConfigHelper.get_webhook_url())
+        except ValueError as e:
+            parser.error(str(e))
+
+    if args.command == "run":
+        with open(args.numbers_file, 'r') as f:
+            numbers = [re.sub(NUMBER_REGEX, '', line.strip()) for line in f if line.strip()]
+        run_coordinator(store, numbers, args.script, args.workers, args.threads, args.engine)
+    elif args.command == "worker":
+        ShardWorker(store, args.campaign_id, build_bot(args.engine), args.threads).run()
+    elif args.command == "status":
+        print(format_progress(store.progress(args.campaign_id)))
+    elif args.command == "cancel":
+        store.cancel(args.campaign_id)
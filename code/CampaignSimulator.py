@@ -0,0 +1,338 @@
+import heapq
+import logging
+import math
+import random
+import threading
+import time
+from CallDispatcher import CallDispatcher
+from DialScheduler import DialScheduler
+from MachineDetection import MachineDetector
+from ProgressTracker import ProgressTracker
+
+
+class SimulationModel:
+    """
+    Assumptions for a dry run. Every field can be overridden from the `simulation`
+    section of config.json; prices are in USD.
+    """
+
+    DEFAULTS = {
+        'answer_rate': 0.35,
+        'busy_rate': 0.05,
+        # Share of calls.create requests that raise
+        'error_rate': 0.01,
+        # Seconds a call rings before it is answered (uniform range)
+        'ring_seconds': (4.0, 20.0),
+        'no_answer_timeout': 30.0,
+        'busy_seconds': 3.0,
+        # Answered call duration is log-normal with this mean (seconds) and shape
+        'answered_duration_mean': 25.0,
+        'answered_duration_sigma': 0.6,
+        'calls_per_second': 1.0,
+        # First synthesis of the script vs. a chunk cache hit
+        'tts_latency': 1.5,
+        'tts_cached_latency': 0.05,
+        'api_latency': 0.3,
+        # From a call ending to its status callback waking the worker
+        'status_callback_latency': 0.2,
+        'twilio_price_per_minute': 0.014,
+        'elevenlabs_price_per_1k_chars': 0.30,
+        # Wall-clock time (epoch seconds) the simulated campaign starts at, for dialing
+        # windows; None means now
+        'start_time': None,
+        'seed': None,
+    }
+
+    def __init__(self, **overrides):
+        unknown = set(overrides) - set(self.DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown simulation settings: {', '.join(sorted(unknown))}")
+        for name, default in self.DEFAULTS.items():
+            setattr(self, name, overrides.get(name, default))
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(**config.get('simulation', {}))
+
+    def answered_duration(self, rng):
+        sigma = self.answered_duration_sigma
+        mu = math.log(self.answered_duration_mean) - sigma * sigma / 2
+        return rng.lognormvariate(mu, sigma)
+
+
+class SimulatedResults:
+    """Result sink for dry runs: counts outcomes instead of appending to success/retry files"""
+
+    def __init__(self):
+        self.statuses = {}
+
+    def record(self, number, call_sid, status, duration=None, reason=None):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+class VirtualClock:
+    """
+    Simulated time for real worker threads.
+
+    Only one thread runs at a time. A thread that sleeps hands over to whichever
+    sleeper is due first, and the clock jumps to that sleeper's deadline, so a worker
+    blocked for a minute of virtual time costs one thread switch. Runs with a seed are
+    reproducible because the order threads run in is fixed by (deadline, sleep order).
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self._sleepers = []
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        return self.now
+
+    def _push(self, deadline, wake):
+        self._sequence += 1
+        heapq.heappush(self._sleepers, (deadline, self._sequence, wake))
+
+    def _resume_next(self):
+        # Callers hold self._lock and have just stopped running
+        if self._sleepers:
+            deadline, _, wake = heapq.heappop(self._sleepers)
+            self.now = max(self.now, deadline)
+            wake.set()
+
+    def sleep(self, seconds):
+        if seconds <= 0:
+            return
+        wake = threading.Event()
+        with self._lock:
+            self._push(self.now + seconds, wake)
+            self._resume_next()
+        wake.wait()
+
+    def wait(self, event, timeout):
+        """threading.Event.wait in virtual time; nothing sets the events of a dry run early"""
+        self.sleep(timeout)
+        return event.is_set()
+
+    def spawn(self, target, count):
+        """Start `count` threads running `target`; they take turns once run() is called"""
+        threads = []
+        for _ in range(count):
+            wake = threading.Event()
+            with self._lock:
+                self._push(self.now, wake)
+
+            def run(wake=wake):
+                wake.wait()
+                try:
+                    target()
+                finally:
+                    with self._lock:
+                        self._resume_next()
+
+            thread = threading.Thread(target=run, daemon=True)
+            thread.start()
+            threads.append(thread)
+        return threads
+
+    def run(self, threads):
+        with self._lock:
+            self._resume_next()
+        for thread in threads:
+            thread.join()
+
+
+class SimulatedStatusBoard:
+    """CallStatusBoard stand-in: each call's final status is decided when it is placed"""
+
+    def __init__(self, clock, callback_latency):
+        self.clock = clock
+        self.callback_latency = callback_latency
+        self.in_flight = 0
+        self.peak = 0
+        self._calls = {}
+
+    def place(self, call_sid, status, length):
+        # The final status callback reaches the board a little after the call ends
+        self._calls[call_sid] = (status, self.clock.now + length + self.callback_latency)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+
+    def wait(self, call_sid, timeout):
+        # A dry run is never cancelled, so sleep straight through to the final status
+        # instead of waking every `timeout` to look for a cancel
+        status, noticed_at = self._calls[call_sid]
+        self.clock.sleep(noticed_at - self.clock.now)
+        return status
+
+    def forget(self, call_sid):
+        if self._calls.pop(call_sid, None) is not None:
+            self.in_flight -= 1
+
+
+class SimulatedBot:
+    """
+    TwilioCallBot stand-in for dry runs. make_call spends the modelled synthesis and
+    API time on the virtual clock, then draws the call's outcome from the model.
+    """
+
+    def __init__(self, model, clock, tts_characters):
+        self.model = model
+        self.clock = clock
+        self.status_board = SimulatedStatusBoard(clock, model.status_callback_latency)
+        # Never configured, so every status passes through unchanged
+        self.machine_detector = MachineDetector(max_workers=1)
+        self.billed_minutes = 0
+        self._calls = 0
+        self._attempts = {}
+        self._random = random.Random(model.seed)
+        # Concurrent first misses share one synthesis, like TTSBackend's single-flight
+        self._tts_ready_at = None if tts_characters else 0.0
+
+    def _rng(self, number):
+        # Keyed by number and attempt so a seeded run draws the same outcomes whatever the dial order
+        if self.model.seed is None:
+            return self._random
+        attempt = self._attempts[number] = self._attempts.get(number, 0) + 1
+        return random.Random(f"{self.model.seed}|{number}|{attempt}")
+
+    def make_call(self, to_number, script_text, voice_id=None):
+        model = self.model
+        clock = self.clock
+        if self._tts_ready_at is None:
+            self._tts_ready_at = clock.now + model.tts_latency
+        audio_ready = max(clock.now + model.tts_cached_latency, self._tts_ready_at)
+        clock.sleep(audio_ready + model.api_latency - clock.now)
+
+        rng = self._rng(to_number)
+        if rng.random() < model.error_rate:
+            raise RuntimeError("Simulated calls.create failure")
+        self._calls += 1
+        call_sid = f"SIM{self._calls:010d}"
+
+        roll = rng.random()
+        if roll < model.answer_rate:
+            low, high = model.ring_seconds
+            talk = model.answered_duration(rng)
+            self.billed_minutes += math.ceil(talk / 60)
+            status, length = 'completed', rng.uniform(low, high) + talk
+        elif roll < model.answer_rate + model.busy_rate:
+            status, length = 'busy', model.busy_seconds
+        else:
+            status, length = 'no-answer', model.no_answer_timeout
+        self.status_board.place(call_sid, status, length)
+        return call_sid
+
+    def cancel_call(self, call_sid):
+        return True
+
+
+class CampaignSimulator:
+    """
+    Dry run of a campaign in virtual time.
+
+    Worker threads run the real CallDispatcher.process_numbers over the same
+    DialScheduler as start_bot (priority order, dialing windows, dial pacing, result
+    and progress accounting); only Twilio and the TTS provider are replaced, by
+    SimulatedBot. Pacing, the scheduler's window checks and the bot all run on a
+    VirtualClock, so closed windows stall workers as they would live and a long
+    campaign simulates in seconds to minutes.
+    """
+
+    def __init__(self, model=None, config=None):
+        self.model = model or SimulationModel()
+        # config.json contents; its `scheduler` section is applied as in start_bot
+        self.config = config or {}
+
+    def run(self, numbers, thread_count, script_text='', tts_characters=None):
+        """
+        Simulate dialing `numbers` with `thread_count` workers.
+        `tts_characters` is what the provider will bill (see TTSBudget.estimate);
+        it defaults to the full script length.
+        """
+        model = self.model
+        if tts_characters is None:
+            tts_characters = len(script_text)
+        start_time = time.time() if model.start_time is None else model.start_time
+
+        clock = VirtualClock()
+        bot = SimulatedBot(model, clock, tts_characters)
+        progress = ProgressTracker(len(numbers))
+        results = SimulatedResults()
+        scheduler = DialScheduler.from_config(numbers, self.config, clock=lambda: start_time + clock.now,
+                                              wait=clock.wait)
+        dispatcher = CallDispatcher(bot, numbers, script_text, progress, results=results,
+                                    calls_per_second=model.calls_per_second, live=False, source=scheduler,
+                                    clock=clock, wait=clock.wait)
+
+        started = time.perf_counter()
+        clock.run(clock.spawn(dispatcher.process_numbers, thread_count))
+
+        twilio_cost = bot.billed_minutes * model.twilio_price_per_minute
+        tts_cost = tts_characters / 1000 * model.elevenlabs_price_per_1k_chars
+        now = clock.now
+        report = {
+            'calls': len(numbers),
+            'threads': thread_count,
+            'wall_clock_seconds': now,
+            'peak_concurrency': bot.status_board.peak,
+            'calls_per_minute': len(numbers) / now * 60 if now else 0.0,
+            'statuses': results.statuses,
+            'average_duration': progress.average_duration,
+            'twilio_minutes': bot.billed_minutes,
+            'twilio_cost': twilio_cost,
+            'tts_characters': tts_characters,
+            'tts_cost': tts_cost,
+            'total_cost': twilio_cost + tts_cost,
+            'simulated_in': time.perf_counter() - started,
+        }
+        logging.info(f"Dry run: {report}")
+        return report
+
+
+def format_duration(seconds):
+    hours, rest = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}h {minutes:02d}m {seconds:02d}s"
+
+
+def format_report(report):
+    statuses = ", ".join(f"{status}: {count}" for status, count in sorted(report['statuses'].items()))
+    return (
+        f"Calls: {report['calls']} with {report['threads']} threads\n"
+        f"Expected wall-clock: {format_duration(report['wall_clock_seconds'])}\n"
+        f"Peak concurrent calls: {report['peak_concurrency']}\n"
+        f"Throughput: {report['calls_per_minute']:.1f} calls/min\n"
+        f"Outcomes: {statuses}\n"
+        f"Twilio: {report['twilio_minutes']} billed minutes, ${report['twilio_cost']:.2f}\n"
+        f"ElevenLabs: {report['tts_characters']} characters, ${report['tts_cost']:.2f}\n"
+        f"Total: ${report['total_cost']:.2f}"
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    import re
+    import ConfigHelper
+    from constants import NUMBER_REGEX
+
+    parser = argparse.ArgumentParser(description="Dry-run a calling campaign in simulated time")
+    parser.add_argument("numbers_file")
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--cps", type=float, help="Override the model's calls per second")
+    parser.add_argument("--script", default="", help="Call script, used to price TTS")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    with open(args.numbers_file, 'r') as f:
+        numbers = [re.sub(NUMBER_REGEX, '', line.strip()) for line in f if line.strip()]
+
+    config = ConfigHelper.load_config()
+    model = SimulationModel.from_config(config)
+    if args.cps is not None:
+        model.calls_per_second = args.cps
+    if args.seed is not None:
+        model.seed = args.seed
+    # Simulated calls.create failures are logged like real ones; the report counts them
+    logging.disable(logging.ERROR)
+    print(format_report(CampaignSimulator(model, config).run(numbers, args.threads, args.script)))
@@ -0,0 +1,140 @@
+import bisect
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from Metrics import Counter, Histogram, VARIANT_CALLS
+
+
+class Variant:
+    """One script/voice combination in an A/B test"""
+
+    __slots__ = ('name', 'script', 'voice_id', 'weight')
+
+    def __init__(self, name, script, voice_id=None, weight=1):
+        self.name = name
+        self.script = script
+        self.voice_id = voice_id
+        self.weight = weight
+
+
+class VariantStats:
+    """Outcome counts and answered-call durations for one variant, updated as calls finish"""
+
+    def __init__(self):
+        self.calls = Counter()
+        self.completed = Counter()
+        self.durations = Histogram()
+        self._statuses = {}
+        self._lock = threading.Lock()
+
+    def record(self, status, duration=None):
+        self.calls.inc()
+        with self._lock:
+            self._statuses[status] = self._statuses.get(status, 0) + 1
+        if status == 'completed':
+            self.completed.inc()
+            if duration is not None:
+                self.durations.observe(duration)
+
+    def summary(self):
+        calls = self.calls.value
+        completed = self.completed.value
+        with self._lock:
+            statuses = dict(self._statuses)
+        return {
+            'calls': calls,
+            'completed': completed,
+            'answer_rate': completed / calls if calls else 0.0,
+            'statuses': statuses,
+            'avg_duration': self.durations.summary()['mean'],
+            'p50_duration': self.durations.percentile(50),
+            'p90_duration': self.durations.percentile(90),
+        }
+
+
+class VariantSet:
+    """
+    Script/voice variants for one campaign.
+    Each number is assigned by hashing it, so the same number always gets the same
+    variant across runs and processes, with shares proportional to the weights.
+    """
+
+    def __init__(self, variants):
+        if not variants:
+            raise ValueError("A variant set needs at least one variant")
+        self.variants = variants
+        self.stats = {variant.name: VariantStats() for variant in variants}
+        self._cumulative = []
+        total = 0
+        for variant in variants:
+            total += variant.weight
+            self._cumulative.append(total)
+        self._total_weight = total
+
+    def __len__(self):
+        return len(self.variants)
+
+    @classmethod
+    def from_config(cls, config, default_script, default_voice_id=None):
+        """
+        Build from the optional `variants` list in config.json, e.g.
+        [{"name": "A", "script": "...", "voice_id": "...", "weight": 1}, ...].
+        Missing scripts or voices fall back to the GUI's script and voice.
+        Returns None when no variants are configured.
+        """
+        entries = config.get('variants')
+        if not entries:
+            return None
+        variants = []
+        for index, entry in enumerate(entries):
+            weight = int(entry.get('weight', 1))
+            if weight < 1:
+                raise ValueError(f"Variant weights must be at least 1 (variant {index + 1})")
+            variants.append(Variant(
+                entry.get('name') or chr(ord('A') + index),
+                entry.get('script') or default_script,
+                entry.get('voice_id') or default_voice_id,
+                weight
+            ))
+        if len({variant.name for variant in variants}) != len(variants):
+            raise ValueError("Variant names must be unique")
+        return cls(variants)
+
+    def assign(self, number):
+        bucket = int(hashlib.sha1(number.encode('utf-8')).hexdigest()[:8], 16) % self._total_weight
+        return self.variants[bisect.bisect_right(self._cumulative, bucket)]
+
+    def scripts(self):
+        """(script, voice_id) pairs, as TTSBudget.estimate expects"""
+        return [(variant.script, variant.voice_id) for variant in self.variants]
+
+    def presynthesize(self, tts):
+        """Synthesize every variant into the chunk cache so no call waits on TTS"""
+        with ThreadPoolExecutor(max_workers=len(self.variants), thread_name_prefix="variant-tts") as pool:
+            list(pool.map(lambda variant: tts.synthesize_text(variant.script, variant.voice_id), self.variants))
+        logging.info(f"Pre-synthesized {len(self.variants)} variants")
+
+    def record(self, number, status, duration=None):
+        variant = self.assign(number)
+        self.stats[variant.name].record(status, duration)
+        VARIANT_CALLS.labels(variant.name, status).inc()
+
+    def summary(self):
+        return {name: stats.summary() for name, stats in self.stats.items()}
+
+    def dump(self, path):
+        try:
+            with open(path, 'w') as f:
+                json.dump(self.summary(), f, indent=4)
+            logging.info(f"Variant results written to {path}")
+        except Exception as e:
+            logging.error(f"Error writing variant results: {e}")
+
+    def summary_text(self):
+        lines = []
+        for name, stats in self.summary().items():
+            lines.append(f"{name}: {stats['completed']}/{stats['calls']} answered "
+                         f"({stats['answer_rate']:.0%}), avg {stats['avg_duration']:.0f}s")
+        return "\n".join(lines)
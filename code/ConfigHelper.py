@@ -1,37 +1,201 @@
 import json
+import logging
+import os
+import threading
+import time
+import weakref
 CONFIG_FILE = 'config.json'
 
 
-def get_webhook_url():
-    try:
-        with open(CONFIG_FILE, 'r') as f:
-            config = json.load(f)
-            return config.get('webhook_url', '')
-    except:
-        return ""
+class ConfigService:
+    """
+    Single owner of config.json.
+    The parsed file is cached in memory and swapped atomically when the file's mtime
+    changes, so hot paths read from memory while still picking up edits without a restart.
+    Subscribers are called with the new config after every reload or save, always on the
+    watcher thread: they may do network calls or rebuild clients, and the callers that
+    notice changes are request handlers, dial workers and the Tk thread.
+    """
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._config = {}
+        self._mtime = None
+        # mtime of a file that failed to parse; it isn't retried until it changes again
+        self._failed_mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._watcher = None
+        self._watcher_lock = threading.Lock()
+        self._pending = threading.Event()
+        self._swap()
+
+    def _stat_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _changed(self):
+        mtime = self._stat_mtime()
+        return mtime != self._mtime and mtime != self._failed_mtime
+
+    def _read(self):
+        # Callers hold self._lock
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def _swap(self):
+        """Re-read the file into memory, keeping the last good config if it can't be parsed"""
+        with self._lock:
+            mtime = self._stat_mtime()
+            try:
+                config = {} if mtime is None else self._read()
+            except Exception as e:
+                logging.error(f"Error reading {self.path}: {e}")
+                self._failed_mtime = mtime
+                return None
+            self._config = config
+            self._mtime = mtime
+            self._failed_mtime = None
+        return config
+
+    def _publish(self):
+        """Have the watcher thread pass the current config to subscribers"""
+        self._pending.set()
+        self.start_watching()
+
+    def reload(self):
+        """Re-read the file now; subscribers hear about it from the watcher thread"""
+        config = self._swap()
+        if config is None:
+            return self._config
+        self._publish()
+        return config
+
+    def check(self):
+        """Reload if the file changed on disk; returns True when a reload happened"""
+        if self._changed():
+            return self._swap() is not None
+        return False
+
+    def get(self):
+        # Only stat the file once per check_interval; otherwise this is a plain attribute read
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            if self._changed() and self._swap() is not None:
+                self._publish()
+        return self._config
+
+    def _write(self, config):
+        # Callers hold self._lock
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(config, f, indent=4)
+        os.replace(tmp_path, self.path)
+        self._config = config
+        self._mtime = self._stat_mtime()
+        self._failed_mtime = None
+
+    def save(self, config):
+        """Write the config atomically and publish it to subscribers"""
+        config = dict(config)
+        with self._lock:
+            self._write(config)
+        self._publish()
+
+    def update(self, **values):
+        """Merge the given keys into the config file"""
+        if not os.path.exists(self.path):
+            logging.warning(f"Config file {self.path} not found to update {', '.join(values)}.")
+            return False
+        # Read, merge and write under one lock so concurrent updates don't drop each other's keys.
+        # The file is re-read because it may have been edited since the last swap.
+        with self._lock:
+            try:
+                config = self._read()
+            except Exception as e:
+                logging.error(f"Error reading {self.path} to update {', '.join(values)}: {e}")
+                return False
+            config.update(values)
+            self._write(config)
+        self._publish()
+        return True
+
+    def subscribe(self, callback):
+        """
+        Register a callback(config). Bound methods are held weakly so short-lived
+        objects such as a per-campaign bot don't need to unsubscribe.
+        """
+        ref = weakref.WeakMethod(callback) if hasattr(callback, '__self__') else (lambda: callback)
+        with self._lock:
+            self._subscribers.append(ref)
+
+    def _notify(self, config):
+        with self._lock:
+            self._subscribers = [ref for ref in self._subscribers if ref() is not None]
+            callbacks = [ref() for ref in self._subscribers]
+        for callback in callbacks:
+            if callback is None:
+                continue
+            try:
+                callback(config)
+            except Exception as e:
+                logging.error(f"Config subscriber {callback} failed: {e}")
 
+    def start_watching(self):
+        """Poll the file's mtime in the background so idle subscribers still see edits"""
+        with self._watcher_lock:
+            if self._watcher is not None:
+                return
+
+            def watch():
+                while True:
+                    pending = self._pending.wait(self.check_interval)
+                    self._pending.clear()
+                    try:
+                        # Changes swapped in by get(), reload(), save() or update() set _pending
+                        if self.check() or pending:
+                            self._notify(self._config)
+                    except Exception as e:
+                        logging.error(f"Config watcher error: {e}")
+
+            self._watcher = threading.Thread(target=watch, daemon=True, name="config-watcher")
+            self._watcher.start()
+
+
+config_service = ConfigService(CONFIG_FILE)
+
+
+def load_config(force=False):
+    """Return the in-memory config, re-reading the file first when forced"""
+    if force:
+        return config_service.reload()
+    return config_service.get()
+
+
+def save_config(config):
+    config_service.save(config)
+
+
+def update_config(**values):
+    return config_service.update(**values)
+
+
+def get_webhook_url():
+    return config_service.get().get('webhook_url', '')
 
 
 def get_twilio_account_sid():
-    try:
-        with open(CONFIG_FILE, 'r') as f:
-            config = json.load(f)
-            return config.get('account_sid', '')
-    except:
-        return ""
+    return config_service.get().get('account_sid', '')
+
 
 def get_twilio_auth_token():
-    try:
-        with open(CONFIG_FILE, 'r') as f:
-            config = json.load(f)
-            return config.get('auth_token', '')
-    except:
-        return ""
+    return config_service.get().get('auth_token', '')
+
 
 def get_twilio_phone_number():
-    try:
-        with open(CONFIG_FILE, 'r') as f:
-            config = json.load(f)
-            return config.get('phone_number', '')
-    except:
-        return ""
+    return config_service.get().get('phone_number', '')
@@ -0,0 +1,236 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from constants import RETRY_FILE, SUCCESS_FILE
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+except ImportError:  # Python < 3.9
+    ZoneInfo = ZoneInfoNotFoundError = None
+
+# Area codes that lie entirely within one time zone. Numbers from split or unknown
+# area codes fall back to the scheduler's default zone.
+AREA_CODE_ZONES = {
+    'America/New_York': "201 202 203 207 212 215 216 240 267 301 302 305 315 321 330 347 352 386 401 404 "
+                        "407 410 412 413 434 440 443 484 508 516 518 540 551 561 570 571 585 603 607 609 "
+                        "610 614 617 631 646 678 703 704 716 718 727 732 754 757 770 772 774 781 786 802 "
+                        "803 804 813 828 843 845 856 860 862 904 908 910 914 917 919 929 937 941 954 973 978",
+    'America/Chicago': "205 210 214 217 218 224 225 251 254 262 281 309 312 314 316 318 319 320 334 337 "
+                       "346 361 409 414 417 430 469 479 501 504 507 512 515 563 573 601 608 612 615 618 "
+                       "630 636 651 662 682 708 713 715 737 763 773 815 816 817 830 832 847 901 903 913 "
+                       "918 920 936 940 952 956 972 979",
+    'America/Denver': "303 307 385 406 435 505 575 719 720 801 915 970",
+    'America/Phoenix': "480 520 602 623 928",
+    'America/Los_Angeles': "206 209 213 253 310 323 360 408 415 424 425 503 509 510 530 559 562 619 626 "
+                           "650 657 661 702 707 714 725 747 760 775 805 818 831 858 909 916 925 949 951 971",
+    'America/Anchorage': "907",
+    'Pacific/Honolulu': "808",
+}
+ZONE_BY_AREA_CODE = {code: zone for zone, codes in AREA_CODE_ZONES.items() for code in codes.split()}
+
+# Priority buckets per tier; never-tried numbers sit in the upper tier
+BUCKETS_PER_TIER = 50
+
+
+def area_code(number):
+    return number[-10:-7] if len(number) >= 10 else ''
+
+
+class CallHistory:
+    """Attempts and answers per number and per area code, read from past result files"""
+
+    def __init__(self, prior_weight=5.0):
+        self.prior_weight = prior_weight
+        self.attempts = {}
+        self.answered = {}
+        self.area_attempts = {}
+        self.area_answered = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, files=(SUCCESS_FILE, RETRY_FILE), prior_weight=5.0):
+        history = cls(prior_weight)
+        for path in files:
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r') as f:
+                for line in f:
+                    parts = line.strip().split(',', 2)
+                    if len(parts) == 3:
+                        history.record(parts[0], parts[2])
+        return history
+
+    def record(self, number, status):
+        answered = 1 if status == 'completed' else 0
+        code = area_code(number)
+        with self._lock:
+            self.attempts[number] = self.attempts.get(number, 0) + 1
+            self.answered[number] = self.answered.get(number, 0) + answered
+            self.area_attempts[code] = self.area_attempts.get(code, 0) + 1
+            self.area_answered[code] = self.area_answered.get(code, 0) + answered
+
+    @property
+    def overall_rate(self):
+        attempts = sum(self.area_attempts.values())
+        return sum(self.area_answered.values()) / attempts if attempts else 0.5
+
+    def answer_likelihood(self, number, overall=None):
+        """Smoothed answer rate: the number's own history shrunk toward its area code's, and that toward the overall rate"""
+        overall = self.overall_rate if overall is None else overall
+        code = area_code(number)
+        area_rate = ((self.area_answered.get(code, 0) + overall * self.prior_weight)
+                     / (self.area_attempts.get(code, 0) + self.prior_weight))
+        return ((self.answered.get(number, 0) + area_rate * self.prior_weight)
+                / (self.attempts.get(number, 0) + self.prior_weight))
+
+
+class DialScheduler:
+    """
+    CallDispatcher number source that dials the most promising number first.
+
+    Numbers are kept in priority buckets per time zone: never-tried numbers rank above
+    retries, and within each tier by historical answer likelihood. `take` serves the
+    highest non-empty bucket among zones whose local dialing window is open, so the
+    cost per number is O(zones) no matter how many millions are pending. When numbers
+    remain but every window is closed, `take` waits for one to open.
+
+    Buckets are FIFO, so without history or windows this dials in file order.
+    """
+
+    def __init__(self, numbers, history=None, window=None, default_zone=None, prefer_new=True,
+                 zone_refresh=30.0, clock=time.time, wait=threading.Event.wait):
+        self.history = history or CallHistory()
+        self.window = tuple(window) if window else None
+        if self.window and not (len(self.window) == 2 and 0 <= self.window[0] < self.window[1] <= 24):
+            raise ValueError(f"Dialing window must be [start_hour, end_hour] with start < end, got {window}")
+        if self.window and not default_zone:
+            # A number with an unlisted area code would otherwise have no local time and be dialed at any hour
+            raise ValueError("A dialing window needs a default_timezone for numbers whose area code has no known zone")
+        # Wall-clock source for the dialing windows and how to sleep until the next check;
+        # the simulator passes its virtual clock's
+        self.clock = clock
+        self._wait = wait
+        self.default_zone = default_zone
+        self.prefer_new = prefer_new
+        self.zone_refresh = zone_refresh
+        self._zones = {}
+        self._tops = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._open_zones = None
+        self._open_checked = 0.0
+        self._tz_cache = {}
+        if self.window:
+            self._load_zones()
+
+        overall = self.history.overall_rate
+        for number in numbers:
+            self._push(number, self._bucket(number, overall))
+        logging.info(f"Scheduled {self._size} numbers across {len(self._zones)} time zones")
+
+    def _load_zones(self):
+        """
+        Resolve every zone a number can be placed in up front. Dialing windows protect
+        recipients, so a missing time zone database is an error rather than a reason to
+        dial at any hour. Windows has no system database; the tzdata package provides it.
+        """
+        if ZoneInfo is None:
+            raise ValueError("Dialing windows need Python 3.9 or newer (zoneinfo)")
+        zones = set(AREA_CODE_ZONES)
+        if self.default_zone:
+            zones.add(self.default_zone)
+        for zone in zones:
+            try:
+                self._tz_cache[zone] = ZoneInfo(zone)
+            except (ZoneInfoNotFoundError, ValueError) as e:
+                raise ValueError(f"Time zone {zone} is unavailable ({e}); install the tzdata package") from e
+
+    def _zone(self, number):
+        return ZONE_BY_AREA_CODE.get(area_code(number), self.default_zone) if self.window else None
+
+    def _bucket(self, number, overall):
+        likelihood = self.history.answer_likelihood(number, overall)
+        bucket = min(int(likelihood * BUCKETS_PER_TIER), BUCKETS_PER_TIER - 1)
+        if self.prefer_new and not self.history.attempts.get(number):
+            bucket += BUCKETS_PER_TIER
+        return bucket
+
+    def _push(self, number, bucket):
+        zone = self._zone(number)
+        buckets = self._zones.get(zone)
+        if buckets is None:
+            buckets = self._zones[zone] = [deque() for _ in range(2 * BUCKETS_PER_TIER)]
+            self._tops[zone] = -1
+        buckets[bucket].append(number)
+        self._tops[zone] = max(self._tops[zone], bucket)
+        self._size += 1
+
+    def _is_open(self, zone, now):
+        if zone is None:
+            return True
+        start, end = self.window
+        return start <= datetime.fromtimestamp(now, self._tz_cache[zone]).hour < end
+
+    def _open(self):
+        now = self.clock()
+        if self._open_zones is None or now - self._open_checked >= self.zone_refresh:
+            self._open_zones = {zone for zone in self._zones if self._is_open(zone, now)}
+            self._open_checked = now
+        return self._open_zones
+
+    def _pop_best(self):
+        best_zone, best = None, -1
+        for zone in self._open():
+            top = self._tops[zone]
+            buckets = self._zones[zone]
+            while top >= 0 and not buckets[top]:
+                top -= 1
+            self._tops[zone] = top
+            if top > best:
+                best_zone, best = zone, top
+        if best < 0:
+            return None
+        self._size -= 1
+        return self._zones[best_zone][best].popleft()
+
+    def poll(self):
+        """The best number dialable right now, or None when drained or every window is closed"""
+        with self._lock:
+            if not self._size:
+                return None
+            return self._pop_best()
+
+    def take(self):
+        while not self._cancelled.is_set():
+            number = self.poll()
+            if number is not None or self.empty():
+                return number
+            # Numbers remain but no zone is inside its dialing window yet
+            self._wait(self._cancelled, self.zone_refresh)
+            with self._lock:
+                self._open_zones = None
+        return None
+
+    def task_done(self, number):
+        pass
+
+    def empty(self):
+        return self._size == 0
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @classmethod
+    def from_config(cls, numbers, config, clock=time.time, wait=threading.Event.wait):
+        """Build from the optional `scheduler` section of config.json"""
+        settings = config.get('scheduler', {})
+        history = CallHistory.load(prior_weight=float(settings.get('prior_weight', 5.0)))
+        return cls(numbers, history,
+                   window=settings.get('window'),
+                   default_zone=settings.get('default_timezone'),
+                   prefer_new=settings.get('prefer_new', True),
+                   clock=clock, wait=wait)
@@ -1,139 +1,103 @@
 import logging
-import os
-import time
-from constants import AUDIO_DIR
-from elevenlabs.client import ElevenLabs # type: ignore
-from elevenlabs import Voice, VoiceSettings, play # type: ignore
+from constants import VOICE_CACHE_FILE, VOICE_CACHE_TTL
+from TTSBackend import TTSBackend
+from VoiceCatalog import VoiceCatalog
+
+class ElevenLabsTTS(TTSBackend):
+    name = "elevenlabs"
 
-class ElevenLabsTTS:
     def __init__(self,audio_dir):
+        super().__init__(audio_dir)
         self.client = None
+        self.api_key = None
         self.voice_id = "21m00Tcm4TlvDq8ikWAM"  # Default voice (Rachel)
         self.voice_name = "Rachel"  # Track voice name too
         self.model = "eleven_multilingual_v2"
-        self.available_voices = []
-        self.is_initialized = False
-        self.audio_dir = audio_dir
+        self.voice_catalog = VoiceCatalog(VOICE_CACHE_FILE, VOICE_CACHE_TTL)
+        self.voice_catalog.add_listener(self._on_voices_refreshed)
+        self.output_format = "mp3_44100_128"
+        self.voice_settings = {
+            'stability': 0.71,
+            'similarity_boost': 0.5,
+            'style': 0.0,
+            'use_speaker_boost': True
+        }
 
     def initialize(self, api_key):
         try:
+            # The elevenlabs SDK is slow to import, so load it on first use
+            from elevenlabs.client import ElevenLabs # type: ignore
             self.client = ElevenLabs(api_key=api_key)
-            self._cache_available_voices()
+            self.api_key = api_key
+            self._load_voice_catalog()
             self.is_initialized = True
             return True
         except Exception as e:
             logging.error(f"Failed to initialize ElevenLabs: {e}")
             return False
 
-    def _cache_available_voices(self):
-        try:
-            response = self.client.voices.get_all()
-            self.available_voices = response.voices
-            
-            # Also set the default voice name if possible
-            for voice in self.available_voices:
-                if voice.voice_id == self.voice_id:
-                    self.voice_name = voice.name
-                    break
-                    
-            logging.info(f"Cached {len(self.available_voices)} voices from ElevenLabs")
-            logging.info(f"Current voice: {self.voice_name} (ID: {self.voice_id})")
-        except Exception as e:
-            logging.error(f"Error fetching voices: {e}")
-            self.available_voices = []
+    @property
+    def available_voices(self):
+        return self.voice_catalog.voices
+
+    def find_voice(self, voice_id):
+        return self.voice_catalog.by_id.get(voice_id)
+
+    def _load_voice_catalog(self):
+        """Serve the cached voice list right away and refresh it in the background when stale"""
+        self.voice_catalog.load(self.api_key)
+        self._on_voices_refreshed()
+        if self.voice_catalog.is_stale():
+            self.voice_catalog.refresh_async(self.api_key)
+
+    def _on_voices_refreshed(self):
+        # Also set the default voice name if possible
+        voice = self.voice_catalog.by_id.get(self.voice_id)
+        if voice:
+            self.voice_name = voice.name
+        logging.info(f"Current voice: {self.voice_name} (ID: {self.voice_id})")
+
+    def on_config_change(self, config):
+        """Re-initialize on a new API key and follow voice changes made in config.json"""
+        super().on_config_change(config)
+        api_key = config.get('elevenlabs_api_key')
+        if api_key and api_key != self.api_key:
+            self.initialize(api_key)
+        voice_id = config.get('voice_id')
+        if voice_id and voice_id != self.voice_id:
+            self.set_voice(voice_id, config.get('voice_name'))
 
     def check_api_key(self):
         if not self.client:
             raise ValueError("ElevenLabs API key not configured. Please add it in the configuration.")
         if not self.is_initialized:
             raise ValueError("TTS service not properly initialized. Please check your API key.")
-        
-    def generate_speech(self, text, output_file=None):
-        self.check_api_key()
+
+    def remaining_characters(self):
+        """Characters left in the current ElevenLabs billing period"""
         try:
-            if output_file is None:
-                output_file = os.path.join(self.audio_dir, f'tts_output_{int(time.time())}.mp3')
-            else:
-                # Just use the path directly without joining it with audio_dir again
-                # This fixes the audio_files/audio_files nesting issue
-                output_file = output_file
-            logging.info(f"Generating speech with voice: {self.voice_name} (ID: {self.voice_id})")
- 
-            audio = self.client.generate(
-                text=text,
-                voice=Voice(
-                    voice_id=self.voice_id,
-                    settings=VoiceSettings(
-                        stability=0.71,
-                        similarity_boost=0.5,
-                        style=0.0,
-                        use_speaker_boost=True
-                    )
-                ),
-                model=self.model,
-                output_format="mp3_44100_128"
-            )
-            
-            if hasattr(audio, '__iter__'):
-                audio_data = b''.join(chunk for chunk in audio)
-            else:
-                audio_data = audio
-            
-            with open(output_file, 'wb') as f:
-                f.write(audio_data)
-            
-            return output_file
+            subscription = self.client.user.get_subscription()
+            return subscription.character_limit - subscription.character_count
         except Exception as e:
-            logging.error(f"TTS generation error: {e}")
+            logging.error(f"Could not fetch ElevenLabs quota: {e}")
             return None
-        
-        
-    def preview_voice(self, text):
-        self.check_api_key()
-        try:
-            audio = self.client.generate(
-                text=text,
-                voice=Voice(
-                    voice_id=self.voice_id,
-                    settings=VoiceSettings(
-                        stability=0.71,
-                        similarity_boost=0.5,
-                        style=0.0,
-                        use_speaker_boost=True
-                    )
-                ),
-                model=self.model,
-                output_format="mp3_44100_128"
-            )
-            
-            if hasattr(audio, '__iter__'):
-                audio_data = b''.join(chunk for chunk in audio)
-            else:
-                audio_data = audio
-            
-            play(audio_data)
-            return True
-        except Exception as e:
-            logging.error(f"Preview error: {e}")
-            return False
 
-    def get_available_voices(self):
-        self.check_api_key()
-        return [(voice.name, voice.voice_id) for voice in self.available_voices]
+    def cache_key_parts(self):
+        return [self.model, self.output_format, repr(sorted(self.voice_settings.items()))]
 
-    def set_voice(self, voice_id, voice_name=None):
-            """Set the voice to use for speech generation"""
-            old_voice_id = self.voice_id
-            self.voice_id = voice_id
-            
-            # Set voice name if provided, otherwise find it from available voices
-            if voice_name:
-                self.voice_name = voice_name
-            else:
-                for voice in self.available_voices:
-                    if voice.voice_id == voice_id:
-                        self.voice_name = voice.name
-                        break
-            
-            logging.info(f"Voice changed from {old_voice_id} to {self.voice_id} ({self.voice_name})")
-            return True
+    def _synthesize(self, text, voice_id=None):
+        """Run a single ElevenLabs request and return the raw MP3 bytes"""
+        from elevenlabs import Voice, VoiceSettings # type: ignore
+        audio = self.client.generate(
+            text=text,
+            voice=Voice(
+                voice_id=voice_id or self.voice_id,
+                settings=VoiceSettings(**self.voice_settings)
+            ),
+            model=self.model,
+            output_format=self.output_format
+        )
+
+        if hasattr(audio, '__iter__'):
+            audio = b''.join(chunk for chunk in audio)
+        return audio
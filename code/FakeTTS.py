@@ -0,0 +1,48 @@
+import random
+import time
+import uuid
+from TTSBackend import TTSBackend, silent_wav
+from VoiceCatalog import VoiceInfo
+
+
+class FakeTTS(TTSBackend):
+    """
+    Stand-in backend for dry runs and load tests.
+    Produces silence roughly as long as the script would take to read, after a configurable
+    delay, and can fail a fraction of requests to exercise error handling.
+    """
+
+    name = "fake"
+    audio_extension = "wav"
+    CHARS_PER_SECOND = 15
+
+    def __init__(self, audio_dir, latency=0.5, jitter=0.0, failure_rate=0.0, cache_dir=None):
+        super().__init__(audio_dir)
+        if cache_dir:
+            self.cache_dir = cache_dir
+        # The chunk cache persists between runs, so each instance keys its audio apart
+        # and starts cold the way a new script would
+        self.run_id = uuid.uuid4().hex
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.voices = [VoiceInfo('fake-silence', 'Silence', 'fake')]
+        self.voice_id = 'fake-silence'
+        self.voice_name = 'Silence'
+
+    def initialize(self):
+        self.is_initialized = True
+        return True
+
+    @property
+    def available_voices(self):
+        return self.voices
+
+    def cache_key_parts(self):
+        return [self.name, self.audio_extension, self.run_id]
+
+    def _synthesize(self, text, voice_id=None):
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise RuntimeError("Simulated TTS failure")
+        return silent_wav(max(1.0, len(text) / self.CHARS_PER_SECOND))
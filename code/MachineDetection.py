@@ -0,0 +1,159 @@
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from Metrics import AMD_ACTIONS, AMD_RESULTS, CHANNEL_SECONDS_SAVED
+from TTSBackend import audio_duration
+
+# AnsweredBy values that mean nobody is listening to the script
+MACHINE_ANSWERS = ('machine_start', 'machine_end_beep', 'machine_end_silence', 'machine_end_other', 'fax')
+MACHINE_ACTIONS = ('voicemail', 'hangup')
+
+
+class MachineDetectionPolicy:
+    """What to do when an answering machine picks up"""
+
+    def __init__(self, action='hangup', voicemail_script='', voicemail_voice_id=None, timeout=30):
+        if action not in MACHINE_ACTIONS:
+            raise ValueError(f"Unknown machine detection action {action}; use one of {', '.join(MACHINE_ACTIONS)}")
+        if action == 'voicemail' and not voicemail_script:
+            raise ValueError("The voicemail action needs a voicemail_script")
+        self.action = action
+        self.voicemail_script = voicemail_script
+        self.voicemail_voice_id = voicemail_voice_id
+        self.timeout = int(timeout)
+
+    @classmethod
+    def from_config(cls, config, default_voice_id=None):
+        """
+        Build from the optional `machine_detection` section of config.json, e.g.
+        {"action": "voicemail", "voicemail_script": "...", "voicemail_voice_id": "...", "timeout": 30}.
+        Returns None when the section is missing or has "enabled": false.
+        """
+        settings = config.get('machine_detection')
+        if not settings or not settings.get('enabled', True):
+            return None
+        return cls(settings.get('action', 'hangup'),
+                   settings.get('voicemail_script', ''),
+                   settings.get('voicemail_voice_id') or default_voice_id,
+                   settings.get('timeout', 30))
+
+    def create_params(self, webhook_base):
+        """Extra calls.create arguments for asynchronous detection"""
+        return {
+            # A voicemail has to wait for the beep; hanging up only needs to know it's a machine
+            'machine_detection': 'DetectMessageEnd' if self.action == 'voicemail' else 'Enable',
+            'machine_detection_timeout': self.timeout,
+            'async_amd': 'true',
+            'async_amd_status_callback': f"{webhook_base}/amd-callback",
+            'async_amd_status_callback_method': 'POST',
+        }
+
+
+class MachineDetector:
+    """
+    Answering machine handling for live calls.
+
+    Detection runs asynchronously, so the script starts playing as soon as the call is
+    answered. TwilioCallBot tracks each call it places here along with the length of
+    its audio; when the /amd-callback webhook reports a machine, the call is redirected
+    to the short cached voicemail audio or hung up, and the script playback that was
+    skipped is counted as channel time saved. A call hung up here still ends as
+    'completed' on Twilio's side, so `outcome` reports it as 'machine' instead.
+    """
+
+    def __init__(self, max_workers=4):
+        self.policy = None
+        self.voicemail_audio = None
+        self.voicemail_seconds = 0.0
+        self._calls = {}
+        # Calls hung up because a machine answered
+        self._machines = set()
+        self._lock = threading.Lock()
+        # Redirects and hangups go over the network, so keep them off the webhook thread
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="amd")
+
+    def configure(self, policy):
+        self.policy = policy
+        # The voicemail may have changed; prepare() picks up the new audio
+        self.voicemail_audio = None
+        self.voicemail_seconds = 0.0
+
+    @property
+    def enabled(self):
+        return self.policy is not None
+
+    def create_params(self, webhook_base):
+        return self.policy.create_params(webhook_base) if self.policy else {}
+
+    def prepare(self, tts, audio_store):
+        """Synthesize the voicemail once into the audio store, where every call shares it"""
+        policy = self.policy
+        if not policy or policy.action != 'voicemail':
+            return
+        key = hashlib.sha1(f"{tts.name}|{policy.voicemail_voice_id}|{policy.voicemail_script}".encode('utf-8')).hexdigest()
+        relative, path = audio_store.new_path(f"voicemail_{key[:16]}.{tts.audio_extension}")
+        if not audio_store.is_ready(relative):
+            if not tts.generate_speech(policy.voicemail_script, path, policy.voicemail_voice_id):
+                raise Exception("Failed to generate the voicemail audio")
+        if relative != self.voicemail_audio:
+            # Held for the life of the process so the audio GC never removes it
+            audio_store.acquire(relative)
+            self.voicemail_audio = relative
+            self.voicemail_seconds = audio_duration(path) or 0.0
+        logging.info(f"Voicemail audio ready: {relative} ({self.voicemail_seconds:.1f}s)")
+
+    def track(self, call_sid, bot, script_seconds):
+        if self.policy:
+            with self._lock:
+                self._calls[call_sid] = (bot, script_seconds)
+
+    def forget(self, call_sid):
+        with self._lock:
+            self._calls.pop(call_sid, None)
+            self._machines.discard(call_sid)
+
+    def outcome(self, call_sid, status):
+        """The status to record for a finished call"""
+        with self._lock:
+            machine = call_sid in self._machines
+        return 'machine' if machine and status == 'completed' else status
+
+    def on_result(self, call_sid, answered_by, detection_seconds):
+        """Handle an AnsweredBy result; returns immediately"""
+        AMD_RESULTS.labels(answered_by if answered_by in MACHINE_ANSWERS or answered_by == 'human' else 'unknown').inc()
+        with self._lock:
+            entry = self._calls.pop(call_sid, None)
+        if entry is None or answered_by not in MACHINE_ANSWERS:
+            # Humans and inconclusive results hear the whole script
+            return
+        self._pool.submit(self._handle_machine, call_sid, entry[0], entry[1], detection_seconds)
+
+    def _handle_machine(self, call_sid, bot, script_seconds, detection_seconds):
+        policy = self.policy
+        if policy and policy.action == 'voicemail' and self.voicemail_audio:
+            action = 'voicemail'
+            done = bot.redirect_call(call_sid, f"{bot.webhook_url}/twiml?audio={quote(self.voicemail_audio)}")
+            played = self.voicemail_seconds
+        else:
+            action = 'hangup'
+            # Marked first: the final status callback can beat cancel_call's response
+            with self._lock:
+                self._machines.add(call_sid)
+            done = bot.cancel_call(call_sid)
+            if not done:
+                with self._lock:
+                    self._machines.discard(call_sid)
+            played = 0.0
+        if not done:
+            return
+        AMD_ACTIONS.labels(action).inc()
+        if script_seconds:
+            saved = script_seconds - detection_seconds - played
+            if saved > 0:
+                CHANNEL_SECONDS_SAVED.inc(saved)
+        logging.info(f"Answering machine on {call_sid}: {action} after {detection_seconds:.1f}s")
+
+
+machine_detector = MachineDetector()
@@ -0,0 +1,156 @@
+import threading
+from CallTrace import LatencyHistogram
+
+
+class Counter:
+    """
+    Striped counter: each thread increments its own cell, so the hot path never takes a lock.
+    Only the owning thread writes a cell; readers just sum a snapshot of the cells.
+    """
+
+    def __init__(self):
+        self._cells = {}
+
+    def inc(self, amount=1):
+        tid = threading.get_ident()
+        self._cells[tid] = self._cells.get(tid, 0) + amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    @property
+    def value(self):
+        return sum(list(self._cells.values()))
+
+
+class Gauge(Counter):
+    """Striped up/down gauge, e.g. in-flight calls"""
+
+
+class Histogram(LatencyHistogram):
+    """Latency histogram that can also render itself in Prometheus bucket form"""
+
+    def cumulative_buckets(self):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.total
+        running = 0
+        buckets = []
+        for bound, bucket_count in zip(self.BOUNDS, counts):
+            running += bucket_count
+            buckets.append((f"{bound:.6g}", running))
+        buckets.append(("+Inf", running + counts[-1]))
+        return buckets, total
+
+
+class MetricFamily:
+    """A named metric with optional labels; children are created on first use"""
+
+    def __init__(self, name, help_text, metric_type, metric_class, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.metric_type = metric_type
+        self.metric_class = metric_class
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            # Unlabelled metrics are exported as zero before their first update
+            self.labels()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self.metric_class())
+        return child
+
+    # Shortcuts for unlabelled metrics
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    @property
+    def value(self):
+        return sum(child.value for child in list(self._children.values()))
+
+    def _label_str(self, values, extra=None):
+        pairs = list(zip(self.labelnames, values))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"') for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        for values, child in list(self._children.items()):
+            if self.metric_type == 'histogram':
+                buckets, total = child.cumulative_buckets()
+                for le, count in buckets:
+                    lines.append(f"{self.name}_bucket{self._label_str(values, ('le', le))} {count}")
+                lines.append(f"{self.name}_sum{self._label_str(values)} {total}")
+                lines.append(f"{self.name}_count{self._label_str(values)} {buckets[-1][1]}")
+            else:
+                lines.append(f"{self.name}{self._label_str(values)} {child.value}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric family and renders them in the Prometheus text format"""
+
+    def __init__(self):
+        self._families = {}
+
+    def _register(self, name, help_text, metric_type, metric_class, labelnames):
+        family = MetricFamily(name, help_text, metric_type, metric_class, labelnames)
+        self._families[name] = family
+        return family
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(name, help_text, 'counter', Counter, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(name, help_text, 'gauge', Gauge, labelnames)
+
+    def histogram(self, name, help_text, labelnames=()):
+        return self._register(name, help_text, 'histogram', Histogram, labelnames)
+
+    def render(self):
+        lines = []
+        for family in list(self._families.values()):
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+CALLS_STARTED = metrics.counter('callbot_calls_started_total', 'Calls successfully created through the Twilio API')
+CALLS_FINISHED = metrics.counter('callbot_calls_finished_total', 'Calls that reached a final status', ['status'])
+CALLS_IN_FLIGHT = metrics.gauge('callbot_calls_in_flight', 'Calls currently being placed or in progress')
+TTS_CACHE_HITS = metrics.counter('callbot_tts_cache_hits_total', 'TTS chunks served from the cache')
+TTS_CACHE_MISSES = metrics.counter('callbot_tts_cache_misses_total', 'TTS chunks that had to be synthesized')
+TTS_LATENCY = metrics.histogram('callbot_tts_latency_seconds', 'TTS synthesis request latency')
+# Values of the `operation` label on the Twilio API metrics
+TWILIO_API_OPERATIONS = ('create', 'list', 'cancel', 'redirect')
+TWILIO_API_LATENCY = metrics.histogram('callbot_twilio_api_latency_seconds', 'Twilio REST API latency', ['operation'])
+TWILIO_API_ERRORS = metrics.counter('callbot_twilio_api_errors_total', 'Twilio REST API errors', ['operation'])
+CALL_STATUSES_RECONCILED = metrics.counter('callbot_call_statuses_reconciled_total', 'Final call statuses learned from the calls list rather than a callback')
+STATUS_EVENTS_QUEUED = metrics.gauge('callbot_status_events_queued', 'Status callbacks waiting to be applied')
+STATUS_EVENTS_DROPPED = metrics.counter('callbot_status_events_dropped_total', 'Status callbacks dropped because the buffer was full')
+STATUS_EVENT_LAG = metrics.histogram('callbot_status_event_lag_seconds', 'Time from receiving a status callback to applying it')
+AMD_RESULTS = metrics.counter('callbot_amd_results_total', 'Answering machine detection results', ['answered_by'])
+AMD_ACTIONS = metrics.counter('callbot_amd_actions_total', 'Calls cut short after an answering machine picked up', ['action'])
+CHANNEL_SECONDS_SAVED = metrics.counter('callbot_channel_seconds_saved_total', 'Estimated seconds of script playback skipped on answering machines')
+VARIANT_CALLS = metrics.counter('callbot_variant_calls_total', 'Finished calls per script/voice variant', ['variant', 'status'])
+WEBHOOK_REQUESTS = metrics.counter('callbot_webhook_requests_total', 'Webhook requests handled', ['endpoint', 'code'])
+WEBHOOK_LATENCY = metrics.histogram('callbot_webhook_latency_seconds', 'Webhook handler latency', ['endpoint'])
+AUDIO_FILES_COLLECTED = metrics.counter('callbot_audio_files_collected_total', 'Call audio files deleted by the audio GC')
+AUDIO_BYTES_SERVED = metrics.counter('callbot_audio_bytes_served_total', 'Bytes of call audio served to Twilio')
+CANCEL_LATENCY = metrics.histogram('callbot_cancel_latency_seconds', 'Time from aborting a campaign until every call worker has drained')
@@ -0,0 +1,127 @@
+import io
+import logging
+import os
+import struct
+import sys
+import tempfile
+import threading
+import wave
+from TTSBackend import TTSBackend
+from VoiceCatalog import VoiceInfo
+
+
+def _extended_to_float(data):
+    """80-bit IEEE extended float, as AIFF stores its sample rate"""
+    exponent = ((data[0] & 0x7F) << 8) | data[1]
+    mantissa = int.from_bytes(data[2:10], 'big')
+    value = mantissa * 2.0 ** (exponent - 16383 - 63)
+    return -value if data[0] & 0x80 else value
+
+
+def aiff_to_wav(data):
+    """
+    Convert uncompressed AIFF/AIFF-C audio to WAV. NSSpeech on macOS always writes AIFF,
+    whatever extension it is given; anything that isn't AIFF is returned unchanged.
+    """
+    if data[:4] != b'FORM' or data[8:12] not in (b'AIFF', b'AIFC'):
+        return data
+    channels = frames = bits = rate = None
+    little_endian = False
+    samples = b''
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        size = struct.unpack('>I', data[pos + 4:pos + 8])[0]
+        body = data[pos + 8:pos + 8 + size]
+        if chunk_id == b'COMM':
+            channels, frames, bits = struct.unpack('>hIh', body[:8])
+            rate = _extended_to_float(body[8:18])
+            if data[8:12] == b'AIFC':
+                compression = body[18:22]
+                if compression not in (b'NONE', b'sowt'):
+                    raise ValueError(f"Unsupported AIFF-C compression {compression!r}")
+                little_endian = compression == b'sowt'
+        elif chunk_id == b'SSND':
+            offset = struct.unpack('>I', body[:4])[0]
+            samples = body[8 + offset:]
+        # Chunks are padded to an even length
+        pos += 8 + size + (size & 1)
+    if channels is None:
+        raise ValueError("AIFF data has no COMM chunk")
+
+    width = (bits + 7) // 8
+    samples = samples[:frames * channels * width]
+    if width == 1:
+        # AIFF 8-bit samples are signed, WAV's are unsigned
+        samples = bytes((b + 128) & 0xFF for b in samples)
+    elif not little_endian:
+        swapped = bytearray(len(samples))
+        for i in range(width):
+            swapped[i::width] = samples[width - 1 - i::width]
+        samples = bytes(swapped)
+
+    out = io.BytesIO()
+    with wave.open(out, 'wb') as writer:
+        writer.setnchannels(channels)
+        writer.setsampwidth(width)
+        writer.setframerate(int(round(rate)))
+        writer.writeframes(samples)
+    return out.getvalue()
+
+
+class OfflineTTS(TTSBackend):
+    """
+    Local speech synthesis through pyttsx3 (SAPI5 on Windows, NSSpeech on macOS, eSpeak on Linux).
+    No network or quota involved, so campaigns can keep dialing when ElevenLabs is down.
+    Output is always WAV; macOS's AIFF is converted.
+    """
+
+    name = "offline"
+    audio_extension = "wav"
+
+    def __init__(self, audio_dir):
+        super().__init__(audio_dir)
+        self.engine = None
+        self.voices = []
+        # pyttsx3 engines are not thread-safe
+        self._engine_lock = threading.Lock()
+
+    def initialize(self):
+        try:
+            import pyttsx3 # type: ignore
+            self.engine = pyttsx3.init()
+            self.voices = [
+                VoiceInfo(voice.id, voice.name, 'local', {'languages': ", ".join(map(str, voice.languages or []))})
+                for voice in self.engine.getProperty('voices')
+            ]
+            if self.voices and not self.voice_id:
+                self.voice_id, self.voice_name = self.voices[0].voice_id, self.voices[0].name
+            self.is_initialized = True
+            logging.info(f"Offline TTS initialized with {len(self.voices)} local voices")
+            return True
+        except Exception as e:
+            logging.error(f"Failed to initialize offline TTS: {e}")
+            return False
+
+    @property
+    def available_voices(self):
+        return self.voices
+
+    def cache_key_parts(self):
+        # Cached macOS chunks from before the AIFF conversion hold AIFF under a .wav name
+        return super().cache_key_parts() + ['riff']
+
+    def _synthesize(self, text, voice_id=None):
+        native = "aiff" if sys.platform == "darwin" else self.audio_extension
+        fd, tmp_path = tempfile.mkstemp(suffix=f".{native}")
+        os.close(fd)
+        try:
+            with self._engine_lock:
+                if voice_id or self.voice_id:
+                    self.engine.setProperty('voice', voice_id or self.voice_id)
+                self.engine.save_to_file(text, tmp_path)
+                self.engine.runAndWait()
+            with open(tmp_path, 'rb') as f:
+                return aiff_to_wav(f.read())
+        finally:
+            os.remove(tmp_path)
@@ -0,0 +1,106 @@
+import threading
+import tkinter as tk
+from Metrics import Counter, Gauge
+
+
+class ProgressTracker:
+    """
+    Thread-safe progress accounting for a calling campaign.
+    Counters are striped per thread so workers never contend on a lock; only the
+    active call map, which is mutated far less often, is guarded.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self._completed = Counter()
+        self._failed = Counter()
+        self._in_progress = Gauge()
+        self._duration_total = Counter()
+        self._duration_count = Counter()
+        self._active_lock = threading.Lock()
+        self.active_calls = {}  # Track active calls: {phone_number: call_sid}
+        self.cancel_requested = False
+        self.dirty = True
+
+    @property
+    def completed(self):
+        return self._completed.value
+
+    @property
+    def failed(self):
+        return self._failed.value
+
+    @property
+    def in_progress(self):
+        return self._in_progress.value
+
+    @property
+    def average_duration(self):
+        count = self._duration_count.value
+        return self._duration_total.value / count if count else 0.0
+
+    def call_started(self):
+        self._in_progress.inc()
+        self.dirty = True
+
+    def call_placed(self, number, call_sid):
+        with self._active_lock:
+            self.active_calls[number] = call_sid
+
+    def call_finished(self, number, succeeded, duration=None):
+        if duration is not None:
+            self._duration_total.inc(duration)
+            self._duration_count.inc()
+        if succeeded:
+            self._completed.inc()
+        else:
+            self._failed.inc()
+        self._in_progress.dec()
+        with self._active_lock:
+            self.active_calls.pop(number, None)
+        self.dirty = True
+
+    def active_sids(self):
+        with self._active_lock:
+            return list(self.active_calls.values())
+
+    def request_cancel(self):
+        self.cancel_requested = True
+        self.dirty = True
+
+    def snapshot(self):
+        return {
+            'total': self.total,
+            'completed': self.completed,
+            'failed': self.failed,
+            'in_progress': self.in_progress,
+            'cancel_requested': self.cancel_requested,
+        }
+
+
+class ProgressRefresher:
+    """
+    Redraws the progress UI at a fixed frame rate from the Tk main loop, and only when
+    something changed, instead of scheduling a redraw for every call event.
+    """
+
+    def __init__(self, widget, tracker, render, interval_ms=100):
+        self.widget = widget
+        self.tracker = tracker
+        self.render = render
+        self.interval_ms = interval_ms
+
+    def start(self):
+        self.widget.after(0, self._tick)
+
+    def _tick(self):
+        try:
+            if not self.widget.winfo_exists():
+                return
+            if self.tracker.dirty:
+                self.tracker.dirty = False
+                self.render(self.tracker.snapshot())
+            self.widget.after(self.interval_ms, self._tick)
+        except tk.TclError:
+            # Window was closed between the check and the redraw
+            pass
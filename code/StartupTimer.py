@@ -0,0 +1,33 @@
+import logging
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """Records how long each startup stage takes and logs the breakdown once the app is up"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+
+    def record(self, name, seconds):
+        self.stages.append((name, seconds))
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def report(self):
+        total = self.elapsed()
+        lines = [f"  {name:<24}{seconds * 1000:8.1f} ms" for name, seconds in self.stages]
+        logging.info("Startup timing breakdown:\n" + "\n".join(lines) + f"\n  {'total':<24}{total * 1000:8.1f} ms")
+
+
+startup_timer = StartupTimer()
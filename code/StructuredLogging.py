@@ -0,0 +1,159 @@
+import atexit
+import contextvars
+import copy
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Fields attached to every record logged while they are bound
+CONTEXT_FIELDS = ('campaign_id', 'number', 'call_sid')
+
+# Pass as `extra=SAMPLED` on chatty debug lines; only one in `debug_sample_rate` is kept
+SAMPLED = {'sampled': True}
+
+_log_context = contextvars.ContextVar('log_context', default={})
+
+
+def push_context(**fields):
+    """Bind fields for the current thread/request; returns a token for `pop_context`"""
+    return _log_context.set({**_log_context.get(), **fields})
+
+
+def pop_context(token):
+    _log_context.reset(token)
+
+
+@contextmanager
+def log_context(**fields):
+    token = push_context(**fields)
+    try:
+        yield
+    finally:
+        pop_context(token)
+
+
+def bind_context(**fields):
+    """Add fields to the innermost `log_context` (e.g. the CallSid once a call is placed)"""
+    _log_context.set({**_log_context.get(), **fields})
+
+
+class ContextFilter(logging.Filter):
+    """Copies the bound context onto the record in the logging thread, before it is queued"""
+
+    def filter(self, record):
+        for name, value in _log_context.get().items():
+            setattr(record, name, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps one in `rate` DEBUG records marked as sampled, counted per call site"""
+
+    def __init__(self, rate=1):
+        super().__init__()
+        self.rate = rate
+        self._sites = {}
+
+    def filter(self, record):
+        if self.rate <= 1 or record.levelno > logging.DEBUG or not getattr(record, 'sampled', False):
+            return True
+        site = (record.pathname, record.lineno)
+        counter = self._sites.get(site)
+        if counter is None:
+            counter = self._sites.setdefault(site, itertools.count())
+        return next(counter) % self.rate == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for name in CONTEXT_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Render the message and traceback here, but leave the JSON encoding to the listener thread
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class LogPipeline:
+    """
+    Non-blocking logging for the whole process.
+    Callers only filter and enqueue a record; formatting and writing happen on the
+    listener thread, so call workers never contend on a stream handler's lock.
+    """
+
+    def __init__(self):
+        self.listener = None
+        self.sampler = SamplingFilter()
+        self.handler = None
+
+    def setup(self, level=logging.DEBUG, debug_sample_rate=1, stream=None):
+        if self.listener is not None:
+            return
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(JsonFormatter())
+
+        self.handler = _QueueHandler(queue.SimpleQueue())
+        self.handler.addFilter(self.sampler)
+        self.handler.addFilter(ContextFilter())
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(self.handler)
+        self.set_level(level)
+        self.sampler.rate = max(1, int(debug_sample_rate))
+
+        self.listener = logging.handlers.QueueListener(self.handler.queue, output)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def set_level(self, level):
+        if isinstance(level, str):
+            level = logging.getLevelName(level.upper())
+        if isinstance(level, int):
+            logging.getLogger().setLevel(level)
+
+    def on_config_change(self, config):
+        """Follow `log_level` and `log_debug_sample_rate` in config.json at runtime"""
+        if config.get('log_level'):
+            self.set_level(config['log_level'])
+        if config.get('log_debug_sample_rate'):
+            self.sampler.rate = max(1, int(config['log_debug_sample_rate']))
+
+
+log_pipeline = LogPipeline()
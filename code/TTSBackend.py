@@ -0,0 +1,339 @@
+import hashlib
+import io
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+import wave
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import ConfigHelper
+from CallTrace import tracer
+from Metrics import TTS_CACHE_HITS, TTS_CACHE_MISSES, TTS_LATENCY
+from constants import PREVIEW_CACHE_SIZE, TTS_CACHE_DIR, TTS_CHUNK_MIN_CHARS, TTS_CHUNK_THREADS, TTS_MAX_CONCURRENT_REQUESTS
+from TTSBudget import TTSBudget
+
+
+def join_wav(parts):
+    """Concatenate WAV files that share a format into one WAV"""
+    out = io.BytesIO()
+    writer = None
+    for part in parts:
+        with wave.open(io.BytesIO(part), 'rb') as reader:
+            if writer is None:
+                writer = wave.open(out, 'wb')
+                writer.setparams(reader.getparams())
+            writer.writeframes(reader.readframes(reader.getnframes()))
+    if writer is not None:
+        writer.close()
+    return out.getvalue()
+
+
+def silent_wav(seconds, sample_rate=8000):
+    """A mono 16-bit WAV of silence"""
+    out = io.BytesIO()
+    with wave.open(out, 'wb') as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(sample_rate)
+        writer.writeframes(b'\x00\x00' * int(seconds * sample_rate))
+    return out.getvalue()
+
+
+# Layer III bitrates (kbps) by bitrate index, for MPEG-1 and for MPEG-2/2.5
+MP3_BITRATES = {
+    'mpeg1': (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    'mpeg2': (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+
+def audio_duration(path):
+    """
+    Playback length in seconds of a WAV or constant-bitrate MP3 file, or None if it
+    can't be told from the headers. MP3 length comes from the first frame's bitrate.
+    """
+    try:
+        if path.endswith('.wav'):
+            with wave.open(path, 'rb') as reader:
+                return reader.getnframes() / reader.getframerate()
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            header = f.read(10)
+            offset = 0
+            if header[:3] == b'ID3':
+                # ID3v2 tag size is a 28-bit "syncsafe" integer
+                offset = 10 + ((header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9])
+            f.seek(offset)
+            frame = f.read(4)
+        if len(frame) < 4 or frame[0] != 0xFF or (frame[1] & 0xE0) != 0xE0:
+            return None
+        version = 'mpeg1' if (frame[1] >> 3) & 0x03 == 0x03 else 'mpeg2'
+        kbps = MP3_BITRATES[version][(frame[2] >> 4) & 0x0F] if (frame[2] >> 4) & 0x0F < 15 else 0
+        return (size - offset) * 8 / (kbps * 1000) if kbps else None
+    except (OSError, wave.Error, EOFError):
+        return None
+
+
+class TTSBackend(ABC):
+    """
+    Base class for text-to-speech engines used by TwilioCallBot.
+
+    A backend only has to implement `_synthesize` (one request, raw audio bytes) and
+    `available_voices`; chunking, the on-disk chunk cache, preview caching, streaming
+    and writing call audio are shared here.
+    """
+
+    name = "base"
+    audio_extension = "mp3"
+
+    def __init__(self, audio_dir):
+        self.audio_dir = audio_dir
+        # Chunk cache shared by every backend in the process and across runs
+        self.cache_dir = TTS_CACHE_DIR
+        self.voice_id = None
+        self.voice_name = None
+        self.is_initialized = False
+        self.budget = TTSBudget(self._max_concurrent_requests(ConfigHelper.load_config()))
+        # Chunks being synthesized right now, so concurrent misses share one request
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        # Recently previewed audio, keyed by voice, synthesis settings and text on top of the chunk disk cache
+        self._preview_cache = OrderedDict()
+        self._preview_lock = threading.Lock()
+        self._prefetching = set()
+        self._prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="preview-prefetch")
+
+    # --- Backend specific ---------------------------------------------------
+
+    @abstractmethod
+    def _synthesize(self, text, voice_id=None):
+        """Synthesize one piece of text and return the raw audio bytes"""
+
+    @property
+    @abstractmethod
+    def available_voices(self):
+        """VoiceInfo-like objects with voice_id, name, category and labels"""
+
+    def cache_key_parts(self):
+        """Everything besides voice and text that changes the audio"""
+        return [self.name, self.audio_extension]
+
+    def remaining_characters(self):
+        """Characters left on the provider's quota, or None when it isn't metered"""
+        return None
+
+    def check_api_key(self):
+        if not self.is_initialized:
+            raise ValueError(f"{self.name} TTS backend is not initialized.")
+
+    def _join_audio(self, parts):
+        if self.audio_extension == "wav":
+            return join_wav(parts)
+        # MP3 frames can simply be concatenated
+        return b''.join(parts)
+
+    # --- Shared behaviour ---------------------------------------------------
+
+    def _split_sentences(self, text):
+        """Split a script on sentence boundaries, keeping the punctuation"""
+        sentences = [s.strip() for s in re.split(r'(?<=[.!?])\s+', text) if s.strip()]
+        return sentences or [text]
+
+    def _split_script(self, text):
+        return self._split_sentences(text) if len(text) >= TTS_CHUNK_MIN_CHARS else [text]
+
+    def _chunk_cache_path(self, text, voice_id=None):
+        """Cache path for a chunk, keyed by everything that affects the audio"""
+        key = "|".join([voice_id or self.voice_id or "", *self.cache_key_parts(), text])
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.{self.audio_extension}")
+
+    def _synthesize_chunk(self, text, voice_id=None):
+        """Return audio for one chunk, synthesizing it only on a cache miss"""
+        cache_path = self._chunk_cache_path(text, voice_id)
+        if os.path.exists(cache_path):
+            TTS_CACHE_HITS.inc()
+            with open(cache_path, 'rb') as f:
+                return f.read()
+
+        # If another thread is already synthesizing this chunk, wait for its result
+        # instead of paying for the same characters twice
+        with self._inflight_lock:
+            pending = self._inflight.get(cache_path)
+            owner = pending is None
+            if owner:
+                pending = self._inflight[cache_path] = threading.Event()
+        if not owner:
+            pending.wait()
+            if os.path.exists(cache_path):
+                TTS_CACHE_HITS.inc()
+                with open(cache_path, 'rb') as f:
+                    return f.read()
+            # The owner failed; try ourselves
+            return self._synthesize_chunk(text, voice_id)
+
+        try:
+            TTS_CACHE_MISSES.inc()
+            with self.budget.request(text):
+                started = time.monotonic()
+                audio_data = self._synthesize(text, voice_id)
+                TTS_LATENCY.observe(time.monotonic() - started)
+
+            # Write to a temp file first so a concurrent reader never sees a partial chunk;
+            # the name is unique across processes sharing the cache
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(audio_data)
+            os.replace(tmp_path, cache_path)
+            return audio_data
+        finally:
+            with self._inflight_lock:
+                del self._inflight[cache_path]
+            pending.set()
+
+    def synthesize_text(self, text, voice_id=None):
+        """Return the audio bytes for a whole script, going through the chunk cache"""
+        # Long scripts are synthesized sentence by sentence in parallel; every
+        # chunk is cached so an edit only re-synthesizes the sentences that changed
+        chunks = self._split_script(text)
+        if len(chunks) == 1:
+            return self._synthesize_chunk(chunks[0], voice_id)
+
+        workers = min(TTS_CHUNK_THREADS, self.budget.max_concurrent, len(chunks))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            audio_data = self._join_audio(pool.map(lambda chunk: self._synthesize_chunk(chunk, voice_id), chunks))
+        logging.info(f"Synthesized {len(chunks)} chunks with {workers} workers")
+        return audio_data
+
+    def stream_speech(self, text, voice_id=None):
+        """Yield the script's audio chunk by chunk, in order, as soon as each one is ready"""
+        self.check_api_key()
+        chunks = self._split_script(text)
+        workers = min(TTS_CHUNK_THREADS, self.budget.max_concurrent, len(chunks))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(self._synthesize_chunk, chunk, voice_id) for chunk in chunks]
+            for future in futures:
+                yield future.result()
+
+    def generate_speech(self, text, output_file=None, voice_id=None):
+        self.check_api_key()
+        try:
+            if output_file is None:
+                output_file = os.path.join(self.audio_dir, f'tts_output_{uuid.uuid4().hex}.{self.audio_extension}')
+            logging.info(f"Generating speech with {self.name} voice: {self.voice_name} (ID: {voice_id or self.voice_id})")
+
+            tracer.mark('tts_start')
+            audio_data = self.synthesize_text(text, voice_id)
+            tracer.mark('tts_done')
+
+            # Twilio may fetch the file as soon as its name exists, so it only gets the
+            # final name once it is completely written
+            tmp_path = f"{output_file}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(audio_data)
+            os.replace(tmp_path, output_file)
+            tracer.mark('file_written')
+
+            return output_file
+        except Exception as e:
+            logging.error(f"TTS generation error: {e}")
+            return None
+
+    def _preview_key(self, text, voice_id):
+        # Same inputs as the chunk cache key, so a settings change never replays stale audio
+        return (voice_id, *self.cache_key_parts(), text)
+
+    def get_preview_audio(self, text, voice_id=None):
+        """
+        Preview audio for a voice, served from memory when it was heard recently.
+        Misses go through the same chunk cache as calls, so a previewed script is
+        already synthesized when the campaign starts.
+        """
+        key = self._preview_key(text, voice_id or self.voice_id)
+        with self._preview_lock:
+            audio_data = self._preview_cache.get(key)
+            if audio_data is not None:
+                self._preview_cache.move_to_end(key)
+                return audio_data
+
+        audio_data = self.synthesize_text(text, key[0])
+        with self._preview_lock:
+            self._preview_cache[key] = audio_data
+            while len(self._preview_cache) > PREVIEW_CACHE_SIZE:
+                self._preview_cache.popitem(last=False)
+        return audio_data
+
+    def prefetch_previews(self, text, voice_ids):
+        """Warm the preview cache for voices the operator is likely to click next"""
+        if not self.is_initialized:
+            return
+        for voice_id in voice_ids:
+            key = self._preview_key(text, voice_id)
+            with self._preview_lock:
+                if key in self._preview_cache or key in self._prefetching:
+                    continue
+                self._prefetching.add(key)
+            self._prefetch_pool.submit(self._prefetch_one, text, voice_id, key)
+
+    def _prefetch_one(self, text, voice_id, key):
+        try:
+            self.get_preview_audio(text, voice_id)
+        except Exception as e:
+            logging.error(f"Preview prefetch failed for {voice_id}: {e}")
+        finally:
+            with self._preview_lock:
+                self._prefetching.discard(key)
+
+    def play_audio(self, audio_data):
+        # elevenlabs.play just pipes the bytes to ffplay, so it works for any backend
+        from elevenlabs import play # type: ignore
+        play(audio_data)
+
+    def preview_voice(self, text, voice_id=None):
+        self.check_api_key()
+        try:
+            audio_data = self.get_preview_audio(text, voice_id)
+            self.play_audio(audio_data)
+            return True
+        except Exception as e:
+            logging.error(f"Preview error: {e}")
+            return False
+
+    def get_available_voices(self):
+        self.check_api_key()
+        return [(voice.name, voice.voice_id) for voice in self.available_voices]
+
+    def find_voice(self, voice_id):
+        for voice in self.available_voices:
+            if voice.voice_id == voice_id:
+                return voice
+        return None
+
+    def set_voice(self, voice_id, voice_name=None):
+        """Set the voice to use for speech generation"""
+        old_voice_id = self.voice_id
+        self.voice_id = voice_id
+
+        # Set voice name if provided, otherwise look it up
+        if voice_name:
+            self.voice_name = voice_name
+        else:
+            voice = self.find_voice(voice_id)
+            if voice:
+                self.voice_name = voice.name
+
+        logging.info(f"Voice changed from {old_voice_id} to {self.voice_id} ({self.voice_name})")
+        return True
+
+    @staticmethod
+    def _max_concurrent_requests(config):
+        # Provider plans differ in how many simultaneous requests they allow
+        return max(1, int(config.get('tts_max_concurrent_requests') or TTS_MAX_CONCURRENT_REQUESTS))
+
+    def on_config_change(self, config):
+        """Follow the concurrency cap in config.json; backends that read more of it extend this"""
+        self.budget.resize(self._max_concurrent_requests(config))
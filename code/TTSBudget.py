@@ -0,0 +1,80 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from Metrics import Counter
+
+
+class TTSBudget:
+    """
+    Character and concurrency accounting for a TTS backend.
+    Every synthesis request goes through `request`, which caps concurrent requests at the
+    provider's limit and counts the characters actually billed (cache hits never get here).
+    """
+
+    def __init__(self, max_concurrent):
+        self.max_concurrent = max_concurrent
+        self._in_use = 0
+        self._slots = threading.Condition()
+        self._characters = Counter()
+        self._requests = Counter()
+
+    @property
+    def characters_used(self):
+        return self._characters.value
+
+    @property
+    def requests_made(self):
+        return self._requests.value
+
+    def resize(self, max_concurrent):
+        """Change the cap; requests already running keep their slots"""
+        with self._slots:
+            if max_concurrent != self.max_concurrent:
+                logging.info(f"TTS concurrency cap changed from {self.max_concurrent} to {max_concurrent}")
+            self.max_concurrent = max_concurrent
+            self._slots.notify_all()
+
+    @contextmanager
+    def request(self, text):
+        """Hold one of the concurrent-synthesis slots for the duration of a request"""
+        with self._slots:
+            self._slots.wait_for(lambda: self._in_use < self.max_concurrent)
+            self._in_use += 1
+        try:
+            yield
+            # Only successful requests are billed
+            self._characters.inc(len(text))
+            self._requests.inc()
+        finally:
+            with self._slots:
+                self._in_use -= 1
+                self._slots.notify()
+
+    def estimate(self, backend, scripts):
+        """
+        Characters a campaign will need from the provider.
+        `scripts` is a list of (text, voice_id); chunks are deduplicated across scripts
+        and anything already in the chunk cache is free.
+        """
+        unique = {}
+        for text, voice_id in scripts:
+            for chunk in backend._split_script(text):
+                unique.setdefault(backend._chunk_cache_path(chunk, voice_id), chunk)
+
+        cached_chars = 0
+        needed_chars = 0
+        for path, chunk in unique.items():
+            if os.path.exists(path):
+                cached_chars += len(chunk)
+            else:
+                needed_chars += len(chunk)
+
+        estimate = {
+            'chunks': len(unique),
+            'cached_characters': cached_chars,
+            'needed_characters': needed_chars,
+            'remaining_quota': backend.remaining_characters(),
+        }
+        logging.info(f"TTS budget estimate: {estimate}")
+        return estimate
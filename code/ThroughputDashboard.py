@@ -0,0 +1,143 @@
+import time
+import tkinter as tk
+from collections import deque
+from Metrics import TTS_CACHE_HITS, TTS_CACHE_MISSES, TWILIO_API_ERRORS, TWILIO_API_LATENCY, TWILIO_API_OPERATIONS
+
+
+class Sparkline:
+    """A tiny line chart on a canvas; the line item is created once and only its coords change"""
+
+    def __init__(self, master, width=140, height=24, color="#4a6fa5", samples=60):
+        self.width = width
+        self.height = height
+        self.values = deque(maxlen=samples)
+        self.canvas = tk.Canvas(master, width=width, height=height, bg="white",
+                                highlightthickness=1, highlightbackground="#dddddd")
+        self.line = self.canvas.create_line(0, height, 0, height, fill=color, width=1.5)
+
+    def add(self, value):
+        self.values.append(value)
+        if len(self.values) < 2:
+            return
+        peak = max(self.values) or 1
+        step = self.width / (self.values.maxlen - 1)
+        points = []
+        for i, v in enumerate(self.values):
+            points.extend((i * step, self.height - 2 - (v / peak) * (self.height - 4)))
+        self.canvas.coords(self.line, *points)
+
+
+class ThroughputDashboard:
+    """
+    Live campaign statistics for the progress window.
+    Samples the progress tracker and the process metrics at a fixed cadence and derives
+    rolling rates from the deltas between samples, so nothing is computed per call event.
+    """
+
+    ROWS = [
+        ('rate', "Calls / sec"),
+        ('in_flight', "In flight"),
+        ('answer_rate', "Answer rate"),
+        ('avg_duration', "Avg duration"),
+        ('cache_hit_rate', "TTS cache hits"),
+        ('error_rate', "Twilio errors"),
+        ('eta', "ETA"),
+    ]
+
+    def __init__(self, master, tracker, font, bg, interval_ms=1000, window_seconds=10):
+        self.tracker = tracker
+        self.interval_ms = interval_ms
+        self.frame = tk.LabelFrame(master, text="Live Throughput", font=font, bg=bg, padx=10, pady=5)
+        self.samples = deque(maxlen=max(2, int(window_seconds * 1000 / interval_ms) + 1))
+        self.baseline = self._read_counters()
+        self.value_labels = {}
+        self.sparklines = {}
+
+        for row, (key, title) in enumerate(self.ROWS):
+            tk.Label(self.frame, text=title, font=font, bg=bg).grid(row=row, column=0, sticky=tk.W)
+            value_label = tk.Label(self.frame, text="-", font=font, bg=bg, width=10, anchor=tk.E)
+            value_label.grid(row=row, column=1, sticky=tk.E, padx=(5, 10))
+            self.value_labels[key] = value_label
+            if key != 'eta':
+                sparkline = Sparkline(self.frame)
+                sparkline.canvas.grid(row=row, column=2, pady=1)
+                self.sparklines[key] = sparkline
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def start(self):
+        self.frame.after(self.interval_ms, self._tick)
+
+    def _read_counters(self):
+        return {
+            'time': time.monotonic(),
+            'finished': self.tracker.completed + self.tracker.failed,
+            'cache_hits': TTS_CACHE_HITS.value,
+            'cache_misses': TTS_CACHE_MISSES.value,
+            # Every request is timed, failed ones included, so errors and calls cover the same operations
+            'api_calls': sum(TWILIO_API_LATENCY.labels(op).count for op in TWILIO_API_OPERATIONS),
+            'api_errors': sum(TWILIO_API_ERRORS.labels(op).value for op in TWILIO_API_OPERATIONS),
+        }
+
+    def _compute(self):
+        current = self._read_counters()
+        self.samples.append(current)
+        oldest = self.samples[0]
+        base = self.baseline
+        tracker = self.tracker
+
+        elapsed = current['time'] - oldest['time']
+        rate = (current['finished'] - oldest['finished']) / elapsed if elapsed > 0 else 0.0
+
+        finished = tracker.completed + tracker.failed
+        cache_hits = current['cache_hits'] - base['cache_hits']
+        cache_total = cache_hits + current['cache_misses'] - base['cache_misses']
+        api_calls = current['api_calls'] - oldest['api_calls']
+        api_errors = current['api_errors'] - oldest['api_errors']
+
+        remaining = tracker.total - finished
+        if remaining <= 0:
+            eta = 0.0
+        elif rate > 0:
+            eta = remaining / rate
+        else:
+            eta = None
+
+        return {
+            'rate': rate,
+            'in_flight': tracker.in_progress,
+            'answer_rate': tracker.completed / finished if finished else 0.0,
+            'avg_duration': tracker.average_duration,
+            'cache_hit_rate': cache_hits / cache_total if cache_total else 0.0,
+            'error_rate': api_errors / api_calls if api_calls else 0.0,
+            'eta': eta,
+        }
+
+    def _format(self, key, value):
+        if key == 'eta':
+            if value is None:
+                return "-"
+            minutes, seconds = divmod(int(value), 60)
+            hours, minutes = divmod(minutes, 60)
+            return f"{hours}:{minutes:02d}:{seconds:02d}"
+        if key in ('answer_rate', 'cache_hit_rate', 'error_rate'):
+            return f"{value * 100:.1f}%"
+        if key == 'avg_duration':
+            return f"{value:.1f}s"
+        if key == 'in_flight':
+            return str(value)
+        return f"{value:.2f}"
+
+    def _tick(self):
+        try:
+            if not self.frame.winfo_exists():
+                return
+            values = self._compute()
+            for key, value in values.items():
+                self.value_labels[key].config(text=self._format(key, value))
+                if key in self.sparklines:
+                    self.sparklines[key].add(value)
+            self.frame.after(self.interval_ms, self._tick)
+        except tk.TclError:
+            pass
@@ -1,64 +1,155 @@
 import logging
 import os
+import threading
 import time
-from twilio.rest import Client # type: ignore
-from twilio.twiml.voice_response import VoiceResponse # type: ignore
-from constants import WEBHOOK_URL
+import uuid
+from urllib.parse import quote
+import ConfigHelper
+from AudioStore import get_audio_store
+from CallTrace import tracer
+from CallStatusBoard import reconciler, status_board
+from MachineDetection import machine_detector
+from StructuredLogging import SAMPLED
+from Metrics import CALLS_STARTED, TWILIO_API_ERRORS, TWILIO_API_LATENCY
+from TTSBackend import audio_duration
 
 class TwilioCallBot:
     def __init__(self, account_sid, auth_token, from_number, tts_service, audio_dir):
-        self.client = Client(account_sid, auth_token)
+        self.client = self._create_client(account_sid, auth_token)
+        self.account_sid = account_sid
+        self.auth_token = auth_token
         self.from_number = from_number
         self.tts_service = tts_service
         self.audio_dir = audio_dir
+        self.audio_store = get_audio_store(audio_dir)
+        # Audio each active call holds a reference on, released when the call ends
+        self._audio_by_sid = {}
+        self._audio_lock = threading.Lock()
+        self.webhook_url = ConfigHelper.get_webhook_url()
+        # Call workers wait on the board; callbacks and the reconciler fill it in
+        self.status_board = status_board
+        self.reconciler = reconciler
+        # Answering machine handling, configured per campaign; disabled until then
+        self.machine_detector = machine_detector
+        ConfigHelper.config_service.subscribe(self.on_config_change)
 
-    def make_call(self, to_number, script_text):
-        global CURRENT_SCRIPT
-            
+    def _create_client(self, account_sid, auth_token):
+        # Imported here so the twilio SDK only loads once a bot is actually created
+        from twilio.rest import Client # type: ignore
+        return Client(account_sid, auth_token)
+
+    def on_config_change(self, config):
+        """Pick up a new webhook URL or credentials without restarting"""
+        self.webhook_url = config.get('webhook_url', '')
+        account_sid = config.get('account_sid', '')
+        auth_token = config.get('auth_token', '')
+        if account_sid and auth_token and (account_sid, auth_token) != (self.account_sid, self.auth_token):
+            self.client = self._create_client(account_sid, auth_token)
+            self.account_sid, self.auth_token = account_sid, auth_token
+            logging.info("Twilio client recreated with updated credentials")
+        if config.get('phone_number'):
+            self.from_number = config['phone_number']
+
+    def make_call(self, to_number, script_text, voice_id=None):
+        trace = tracer.start(to_number)
+        audio_path = None
         try:
             self.tts_service.check_api_key()
             
             # Generate unique filename for this call
-            filename = f"call_{int(time.time())}.mp3"
-            output_path = os.path.join(self.audio_dir, filename)
+            filename = f"call_{uuid.uuid4().hex}.{self.tts_service.audio_extension}"
+            audio_path, output_path = self.audio_store.new_path(filename)
+            # Referenced from before it exists so the GC never races the call
+            self.audio_store.acquire(audio_path)
             
             # Generate speech file
-            speech_file = self.tts_service.generate_speech(script_text, output_path)
+            speech_file = self.tts_service.generate_speech(script_text, output_path, voice_id)
             if not speech_file:
                 raise Exception("Failed to generate speech file")
             
             if not os.path.exists(speech_file) or os.path.getsize(speech_file) == 0:
                 raise Exception("Generated speech file is empty or missing")
             
-            # Set global variable to the filename only, not the full path
-            CURRENT_SCRIPT = os.path.basename(speech_file)
+            tracer.bind_audio(trace, audio_path)
             
-            # Add logging to print the webhook URL
-            webhook_url = f"{WEBHOOK_URL}/twiml"
-            logging.info(f"Using webhook URL: {webhook_url}")
-            logging.info(f"Audio file created: {speech_file}")
+            # The TwiML handler gets this call's audio from the URL instead of guessing
+            webhook_base = self.webhook_url
+            webhook_url = f"{webhook_base}/twiml?audio={quote(audio_path)}"
+            logging.debug("Using webhook URL: %s", webhook_url, extra=SAMPLED)
+            logging.debug("Audio file created: %s", speech_file, extra=SAMPLED)
             
             # Ensure the URL is properly constructed
-            call = self.client.calls.create(
-                to=f"+1{to_number}",
-                from_=self.from_number,
-                url=webhook_url,
-                status_callback=f"{WEBHOOK_URL}/status-callback",
-                status_callback_event=['initiated', 'ringing', 'answered', 'completed']
-            )
-            logging.info(f"Call initiated to {to_number}, SID: {call.sid}")
+            trace.mark('api_start')
+            api_start = time.monotonic()
+            try:
+                call = self.client.calls.create(
+                    to=f"+1{to_number}",
+                    from_=self.from_number,
+                    url=webhook_url,
+                    status_callback=f"{webhook_base}/status-callback",
+                    status_callback_event=['initiated', 'ringing', 'answered', 'completed'],
+                    **self.machine_detector.create_params(webhook_base)
+                )
+            except Exception:
+                TWILIO_API_ERRORS.labels('create').inc()
+                raise
+            finally:
+                TWILIO_API_LATENCY.labels('create').observe(time.monotonic() - api_start)
+            trace.mark('api_done')
+            CALLS_STARTED.inc()
+            tracer.bind_sid(trace, call.sid)
+            self.status_board.track(call.sid)
+            self.reconciler.start(self)
+            if self.machine_detector.enabled:
+                self.machine_detector.track(call.sid, self, audio_duration(speech_file))
+            with self._audio_lock:
+                self._audio_by_sid[call.sid] = audio_path
+            logging.debug("Call initiated to %s, SID: %s", to_number, call.sid, extra=SAMPLED)
             return call.sid
         except ValueError as ve:
+            tracer.finish(trace)
+            if audio_path:
+                self.audio_store.release(audio_path)
             logging.error(f"TTS validation error for {to_number}: {ve}")
             raise ValueError(str(ve))
         except Exception as e:
+            tracer.finish(trace)
+            if audio_path:
+                self.audio_store.release(audio_path)
             logging.error(f"Error making call to {to_number}: {e}")
             raise
         
-    def get_call_status(self, call_sid):
+    def release_audio(self, call_sid):
+        """Drop the call's reference on its audio once it has ended"""
+        self.machine_detector.forget(call_sid)
+        with self._audio_lock:
+            audio_path = self._audio_by_sid.pop(call_sid, None)
+        if audio_path:
+            self.audio_store.release(audio_path)
+
+    def redirect_call(self, call_sid, url):
+        """Point a live call at new TwiML; returns True if Twilio accepted the update"""
+        api_start = time.monotonic()
+        try:
+            self.client.calls(call_sid).update(url=url, method='POST')
+            return True
+        except Exception as e:
+            TWILIO_API_ERRORS.labels('redirect').inc()
+            logging.error(f"Error redirecting call {call_sid}: {e}")
+            return False
+        finally:
+            TWILIO_API_LATENCY.labels('redirect').observe(time.monotonic() - api_start)
+
+    def cancel_call(self, call_sid):
+        """Hang up a call in any state; returns True if Twilio accepted the update"""
+        api_start = time.monotonic()
         try:
-            call = self.client.calls(call_sid).fetch()
-            return call.status
+            # 'completed' ends in-progress calls too, where 'canceled' only stops queued/ringing ones
+            self.client.calls(call_sid).update(status='completed')
+            return True
         except Exception as e:
-            logging.error(f"Error getting call status for {call_sid}: {e}")
-            return None
\ No newline at end of file
+            TWILIO_API_ERRORS.labels('cancel').inc()
+            logging.error(f"Error cancelling call {call_sid}: {e}")
+            return False
+        finally:
+            TWILIO_API_LATENCY.labels('cancel').observe(time.monotonic() - api_start)
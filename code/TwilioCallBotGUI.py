@@ -1,4 +1,3 @@
-from queue import Empty, Queue
 import subprocess
 import threading
 import time
@@ -8,10 +7,23 @@ import os
 import json
 import logging
 import re
-import requests
+import urllib.request
+import ConfigHelper
 from TwilioCallBot import TwilioCallBot
 from ElevenLabsTTS import ElevenLabsTTS
+from FakeTTS import FakeTTS
+from OfflineTTS import OfflineTTS
+from CallTrace import tracer
+from CallDispatcher import CallDispatcher
+from CampaignResults import ResultRecorder
+from CampaignVariants import VariantSet
+from DialScheduler import DialScheduler
+from MachineDetection import MachineDetectionPolicy, machine_detector
+from CampaignSimulator import CampaignSimulator, SimulationModel, format_report
+from ProgressTracker import ProgressRefresher, ProgressTracker
+from ThroughputDashboard import ThroughputDashboard
 from constants import *
+from StartupTimer import startup_timer
 from ConfigPopup import ConfigPopup
 from VoiceSelectionPopup import VoiceSelectionPopup
 
@@ -40,15 +52,25 @@ class TwilioCallBotGUI:
         
         self.audio_dir = AUDIO_DIR
         self.tts_service = ElevenLabsTTS(AUDIO_DIR)
+        self.tts_backends = {}  # Lazily created offline/fake backends, by engine name
         self.bot = None
         self.threads = []
         self.phone_numbers_file = None
         
-        self.ensure_config_file()
-        self.create_audio_dir()
-        self.setup_ngrok()
-        self.setup_gui()
-        self.load_config()
+        with startup_timer.stage("config file"):
+            self.ensure_config_file()
+        with startup_timer.stage("audio dir"):
+            self.create_audio_dir()
+        with startup_timer.stage("ngrok tunnel"):
+            self.setup_ngrok()
+        with startup_timer.stage("gui layout"):
+            self.setup_gui()
+        with startup_timer.stage("load config + tts"):
+            self.load_config()
+
+        # Keep credentials and the webhook URL current when config.json changes
+        ConfigHelper.config_service.subscribe(self.tts_service.on_config_change)
+        ConfigHelper.config_service.subscribe(self.on_config_change)
 
             
         self.creator_label = tk.Label(
@@ -86,8 +108,7 @@ class TwilioCallBotGUI:
                     return
 
                 # Write the configuration to the file
-                with open(CONFIG_FILE, 'w') as f:
-                    json.dump(config, f, indent=4)
+                ConfigHelper.save_config(config)
                 logging.info(f"Configuration file '{CONFIG_FILE}' created successfully.")
             else:
                 logging.info(f"Configuration file '{CONFIG_FILE}' already exists.")
@@ -99,6 +120,25 @@ class TwilioCallBotGUI:
         if not os.path.exists(AUDIO_DIR):
             os.makedirs(AUDIO_DIR)
             
+    def _wait_for_ngrok_url(self, timeout=NGROK_READY_TIMEOUT, interval=0.1):
+        """Poll the local ngrok API until the tunnel reports a public URL"""
+        deadline = time.monotonic() + timeout
+        last_error = None
+        while time.monotonic() < deadline:
+            if NGROK_PROCESS is not None and NGROK_PROCESS.poll() is not None:
+                raise RuntimeError(f"ngrok exited with code {NGROK_PROCESS.returncode}")
+            try:
+                with urllib.request.urlopen(NGROK_API_URL, timeout=1) as response:
+                    tunnels = json.load(response).get('tunnels', [])
+                # Prefer the https tunnel when ngrok reports more than one
+                for tunnel in sorted(tunnels, key=lambda t: t.get('proto') != 'https'):
+                    if tunnel.get('public_url'):
+                        return tunnel['public_url']
+            except Exception as e:
+                last_error = e
+            time.sleep(interval)
+        raise TimeoutError(f"ngrok tunnel not ready after {timeout}s ({last_error})")
+
     def setup_ngrok(self):
         global WEBHOOK_URL, NGROK_PROCESS
         try:
@@ -108,25 +148,14 @@ class TwilioCallBotGUI:
                 stderr=subprocess.PIPE,
                 text=True
             )
-            time.sleep(2)
 
             try:
-                ngrok_response = requests.get('http://localhost:4040/api/tunnels')
-                ngrok_data = ngrok_response.json()
-                WEBHOOK_URL = ngrok_data['tunnels'][0]['public_url']
+                WEBHOOK_URL = self._wait_for_ngrok_url()
                 logging.info(f"Ngrok webhook URL: {WEBHOOK_URL}")
 
                 # Update the configuration file immediately after obtaining the webhook URL
-                if os.path.exists(CONFIG_FILE):
-                    with open(CONFIG_FILE, 'r+') as f:
-                        config = json.load(f)
-                        config['webhook_url'] = WEBHOOK_URL
-                        f.seek(0)
-                        json.dump(config, f, indent=4)
-                        f.truncate()  # Ensure old content is removed
+                if ConfigHelper.update_config(webhook_url=WEBHOOK_URL):
                     logging.info("Webhook URL updated in configuration file.")
-                else:
-                    logging.warning(f"Config file {CONFIG_FILE} not found to update Webhook URL.")
 
             except Exception as e:
                 logging.error(f"Error fetching ngrok URL: {e}")
@@ -219,6 +248,18 @@ class TwilioCallBotGUI:
         tk.Button(voice_buttons_frame, text="Change Voice", command=self.show_voice_selection, 
                 font=self.normal_font, bg=self.primary_color, fg="white", 
                 pady=5, padx=10).pack(side=tk.RIGHT, fill=tk.X, expand=True, padx=(5, 0))
+
+        # TTS engine used for the next campaign
+        engine_frame = tk.Frame(voice_frame, bg=self.bg_color)
+        engine_frame.pack(fill=tk.X, pady=(5, 0))
+
+        tk.Label(engine_frame, text="TTS Engine:", font=self.small_font,
+               bg=self.bg_color).pack(side=tk.LEFT)
+
+        self.tts_engine = tk.StringVar(value=TTS_ENGINES[0])
+        engine_menu = tk.OptionMenu(engine_frame, self.tts_engine, *TTS_ENGINES)
+        engine_menu.config(font=self.small_font, bg=self.input_bg)
+        engine_menu.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
         
         # Config button
         tk.Button(left_panel, text="Edit API Configuration", command=self.show_config_window, 
@@ -270,6 +311,10 @@ class TwilioCallBotGUI:
                                pady=10, cursor="hand2")
         start_button.pack(fill=tk.X)
 
+        dry_run_button = tk.Button(right_panel, text="Dry Run (simulate campaign)", command=self.dry_run,
+                                 font=self.small_font, bg=self.secondary_color, fg="white", cursor="hand2")
+        dry_run_button.pack(fill=tk.X, pady=(5, 0))
+
     def select_file(self):
         global INPUT_FILE
         file_path = filedialog.askopenfilename(filetypes=[("Text Files", "*.txt")])
@@ -313,6 +358,29 @@ class TwilioCallBotGUI:
             self.status_label.config(text="Ready")
             messagebox.showerror("Error", f"Preview failed: {str(e)}")
             
+    def get_campaign_tts(self):
+        """Return the TTS backend selected for the next campaign, creating it on first use"""
+        engine = self.tts_engine.get()
+        if engine == "ElevenLabs":
+            return self.tts_service
+
+        backend = self.tts_backends.get(engine)
+        if backend is None:
+            if engine == "Offline":
+                backend = OfflineTTS(self.audio_dir)
+            else:
+                config = ConfigHelper.load_config()
+                backend = FakeTTS(
+                    self.audio_dir,
+                    latency=float(config.get('fake_tts_latency', 0.5)),
+                    jitter=float(config.get('fake_tts_jitter', 0.0)),
+                    failure_rate=float(config.get('fake_tts_failure_rate', 0.0))
+                )
+            if not backend.initialize():
+                raise ValueError(f"Could not initialize the {engine} TTS engine.")
+            self.tts_backends[engine] = backend
+        return backend
+
     def show_voice_selection(self):
         """Show voice selection popup window"""
         if not self.tts_service.is_initialized:
@@ -335,25 +403,28 @@ class TwilioCallBotGUI:
                 self.status_label.config(text=f"Status: Ready (Voice: {self.tts_service.voice_name})")
                 
                 # Save the voice selection to config file so it persists between sessions
-                if os.path.exists(CONFIG_FILE):
-                    with open(CONFIG_FILE, 'r+') as f:
-                        config = json.load(f)
-                        config['voice_id'] = self.tts_service.voice_id
-                        config['voice_name'] = self.tts_service.voice_name
-                        f.seek(0)
-                        json.dump(config, f, indent=4)
-                        f.truncate()
+                ConfigHelper.update_config(
+                    voice_id=self.tts_service.voice_id,
+                    voice_name=self.tts_service.voice_name
+                )
                 
         except Exception as e:
             logging.error(f"Voice selection error: {e}")
             messagebox.showerror("Error", f"Failed to open voice selection: {str(e)}")
                     
+    def on_config_change(self, config):
+        """Refresh the module-level credentials after config.json is reloaded or saved"""
+        global TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE_NUMBER, WEBHOOK_URL
+        TWILIO_ACCOUNT_SID = config.get('account_sid', '')
+        TWILIO_AUTH_TOKEN = config.get('auth_token', '')
+        TWILIO_PHONE_NUMBER = config.get('phone_number', '')
+        WEBHOOK_URL = config.get('webhook_url', '')
+
     def load_config(self):
         global TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE_NUMBER, WEBHOOK_URL
         try:
             if os.path.exists(CONFIG_FILE):
-                with open(CONFIG_FILE, 'r') as f:
-                    config = json.load(f)
+                config = ConfigHelper.load_config()
                 
                 TWILIO_ACCOUNT_SID = config.get('account_sid', '')
                 TWILIO_AUTH_TOKEN = config.get('auth_token', '')
@@ -363,8 +434,11 @@ class TwilioCallBotGUI:
                 
                 elevenlabs_api_key = config.get('elevenlabs_api_key', None)
                 if elevenlabs_api_key:
-                    # Initialize TTS service with the API key
-                    if self.tts_service.initialize(elevenlabs_api_key):
+                    # Initialize TTS service with the API key, unless the config
+                    # subscriber already did so for this key
+                    already_initialized = (self.tts_service.is_initialized and
+                                           self.tts_service.api_key == elevenlabs_api_key)
+                    if already_initialized or self.tts_service.initialize(elevenlabs_api_key):
                         # If voice_id exists in config, set it after initialization
                         if 'voice_id' in config and 'voice_name' in config:
                             self.tts_service.set_voice(config['voice_id'], config['voice_name'])
@@ -411,10 +485,7 @@ class TwilioCallBotGUI:
         tk.Label(main_frame, text="Configure API Settings", 
             font=("Helvetica", 16, "bold"), bg=self.bg_color, fg=self.primary_color).pack(pady=(0, 20))
 
-        current_config = {}
-        if os.path.exists(CONFIG_FILE):
-            with open(CONFIG_FILE, 'r') as f:
-                current_config = json.load(f)
+        current_config = ConfigHelper.load_config()
 
         # Create scrollable frame for fields
         canvas = tk.Canvas(main_frame, bg=self.bg_color, highlightthickness=0)
@@ -492,18 +563,14 @@ class TwilioCallBotGUI:
         button_frame.pack(fill=tk.X)
         
         def save_config():
-            config = {key: entry.get().strip() for key, entry in entries.items()}
+            # Keep keys the form doesn't edit, such as the selected voice
+            config = dict(ConfigHelper.load_config())
+            config.update({key: entry.get().strip() for key, entry in entries.items()})
             config['webhook_url'] = WEBHOOK_URL
             
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump(config, f, indent=4)
-
-            if config['elevenlabs_api_key']:
-                if self.tts_service.initialize(config['elevenlabs_api_key']):
-                    self.status_label.config(text="Status: Ready (TTS Configured)")
-                else:
-                    self.status_label.config(text="Status: Ready (TTS Configuration Failed)")
+            ConfigHelper.save_config(config)
 
+            # load_config below initializes the TTS service with the new key
             messagebox.showinfo("Success", "Configuration saved successfully")
             config_window.destroy()
             self.load_config()
@@ -518,6 +585,76 @@ class TwilioCallBotGUI:
         tk.Button(button_frame, text="Cancel", command=cancel_config, font=self.normal_font,
                 bg=self.secondary_color, fg="white", padx=25, pady=10).pack(side=tk.RIGHT, padx=10)
 
+    def read_numbers(self):
+        """Phone numbers from the selected file, or None after telling the user what went wrong"""
+        try:
+            with open(INPUT_FILE, 'r') as f:
+                numbers = [re.sub(NUMBER_REGEX, '', line.strip()) for line in f if line.strip()]
+
+            if not numbers:
+                messagebox.showerror("Error", "No valid phone numbers found in file.")
+                return None
+            return numbers
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to read phone numbers file: {str(e)}")
+            return None
+
+    def read_thread_count(self):
+        try:
+            thread_count = int(self.threads_entry.get())
+            if thread_count < 1:
+                raise ValueError("Thread count must be at least 1")
+        except ValueError as e:
+            messagebox.showerror("Error", "Invalid thread count. Using default of 1.")
+            thread_count = 1
+        return thread_count
+
+    def dry_run(self):
+        """Simulate the campaign with the current numbers, threads and script without dialing"""
+        if not INPUT_FILE:
+            messagebox.showerror("Error", "Please select a phone numbers file.")
+            return
+        numbers = self.read_numbers()
+        if not numbers:
+            return
+        thread_count = self.read_thread_count()
+        script_text = self.script_entry.get("1.0", "end").strip()
+
+        config = ConfigHelper.load_config()
+        try:
+            model = SimulationModel.from_config(config)
+        except ValueError as e:
+            messagebox.showerror("Dry Run", str(e))
+            return
+        if config.get('max_calls_per_second'):
+            model.calls_per_second = config['max_calls_per_second']
+
+        # Without a working TTS backend the simulator prices the whole script
+        tts_characters = None
+        try:
+            tts = self.get_campaign_tts()
+        except ValueError:
+            tts = None
+        if tts is not None and tts.is_initialized:
+            tts_characters = tts.budget.estimate(tts, [(script_text, None)])['needed_characters']
+
+        self.status_label.config(text="Status: Simulating campaign...")
+
+        def simulate():
+            try:
+                report = CampaignSimulator(model, config).run(numbers, thread_count, script_text, tts_characters)
+                self.master.after(0, lambda: self._show_dry_run(report))
+            except Exception as e:
+                logging.error(f"Dry run failed: {e}")
+                message = f"Simulation failed: {e}"
+                self.master.after(0, lambda: messagebox.showerror("Dry Run", message))
+
+        threading.Thread(target=simulate, daemon=True).start()
+
+    def _show_dry_run(self, report):
+        self.status_label.config(text="Status: Dry run complete")
+        messagebox.showinfo("Dry Run", format_report(report))
+
     def start_bot(self):
         global TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE_NUMBER, WEBHOOK_URL, INPUT_FILE, CURRENT_SCRIPT, SUCCESS_FILE, RETRY_FILE
         
@@ -531,10 +668,12 @@ class TwilioCallBotGUI:
             return
 
         try:
-            self.tts_service.check_api_key()
+            tts = self.get_campaign_tts()
+            tts.check_api_key()
         except ValueError as e:
             messagebox.showerror("TTS Error", str(e))
-            self.show_config_window()
+            if self.tts_engine.get() == "ElevenLabs":
+                self.show_config_window()
             return
 
         script_text = self.script_entry.get("1.0", "end").strip()
@@ -542,16 +681,8 @@ class TwilioCallBotGUI:
             messagebox.showerror("Error", "Please provide a script for the call.")
             return
 
-        # Read phone numbers
-        try:
-            with open(INPUT_FILE, 'r') as f:
-                numbers = [re.sub(NUMBER_REGEX, '', line.strip()) for line in f if line.strip()]
-
-            if not numbers:
-                messagebox.showerror("Error", "No valid phone numbers found in file.")
-                return
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to read phone numbers file: {str(e)}")
+        numbers = self.read_numbers()
+        if not numbers:
             return
 
         # Initialize bot
@@ -559,28 +690,58 @@ class TwilioCallBotGUI:
             TWILIO_ACCOUNT_SID,
             TWILIO_AUTH_TOKEN,
             TWILIO_PHONE_NUMBER,
-            self.tts_service,
+            tts,
             self.audio_dir
         )
 
-        # Get thread count
+        thread_count = self.read_thread_count()
+
+        # Optional A/B script/voice variants from config.json
+        config = ConfigHelper.load_config()
         try:
-            thread_count = int(self.threads_entry.get())
-            if thread_count < 1:
-                raise ValueError("Thread count must be at least 1")
-        except ValueError as e:
-            messagebox.showerror("Error", "Invalid thread count. Using default of 1.")
-            thread_count = 1
+            variants = VariantSet.from_config(config, script_text, tts.voice_id)
+        except (TypeError, ValueError) as e:
+            messagebox.showerror("Error", f"Invalid variants in config.json: {e}")
+            return
+        try:
+            machine_policy = MachineDetectionPolicy.from_config(config, tts.voice_id)
+        except (TypeError, ValueError) as e:
+            messagebox.showerror("Error", f"Invalid machine_detection in config.json: {e}")
+            return
+        # Dial the most promising numbers first instead of in file order
+        try:
+            scheduler = DialScheduler.from_config(numbers, config)
+        except (TypeError, ValueError) as e:
+            messagebox.showerror("Error", f"Invalid scheduler in config.json: {e}")
+            return
+        scripts = variants.scripts() if variants else [(script_text, None)]
+        if machine_policy and machine_policy.action == 'voicemail':
+            scripts.append((machine_policy.voicemail_script, machine_policy.voicemail_voice_id))
+
+        # Work out how many TTS characters the campaign will bill before dialing
+        estimate = tts.budget.estimate(tts, scripts)
+        quota = estimate['remaining_quota']
+        if quota is not None and estimate['needed_characters'] > quota:
+            messagebox.showerror("TTS Quota", f"This campaign needs {estimate['needed_characters']} TTS characters "
+                                              f"but only {quota} remain on your plan.")
+            return
+        budget_text = f"TTS characters to synthesize: {estimate['needed_characters']} ({estimate['cached_characters']} cached)"
+        if quota is not None:
+            budget_text += f", {quota} remaining on plan"
 
         # Show confirmation dialog
-        confirm = messagebox.askyesno("Confirm", f"Ready to start {len(numbers)} calls with {thread_count} concurrent threads.\nContinue?")
+        if variants:
+            budget_text += f"\nScript/voice variants: {', '.join(v.name for v in variants.variants)}"
+        if machine_policy:
+            budget_text += f"\nAnswering machines: {'leave a voicemail' if machine_policy.action == 'voicemail' else 'hang up'}"
+        confirm = messagebox.askyesno("Confirm", f"Ready to start {len(numbers)} calls with {thread_count} concurrent threads.\n{budget_text}\nContinue?")
         if not confirm:
             return
 
         # Create progress window
         progress_window = tk.Toplevel(self.master)
         progress_window.title("Call Progress")
-        progress_window.geometry("500x300")
+        progress_window.geometry("520x600")
         progress_window.configure(bg=self.bg_color)
         
         # Add content to the progress window
@@ -622,6 +783,10 @@ class TwilioCallBotGUI:
         failed_calls_label = tk.Label(stats_right, text="0", font=self.normal_font, bg=self.bg_color)
         failed_calls_label.pack(anchor=tk.E)
         
+        # Live throughput panel, filled in once the tracker exists
+        dashboard_frame = tk.Frame(progress_frame, bg=self.bg_color)
+        dashboard_frame.pack(fill=tk.X, pady=(0, 15))
+
         # Cancel button
         cancel_button = tk.Button(progress_frame, text="Cancel All Calls", font=self.normal_font,
                                 bg=self.error_color, fg="white", padx=10, pady=5)
@@ -630,27 +795,23 @@ class TwilioCallBotGUI:
         # Update the main status label
         self.status_label.config(text="Status: Calls in progress...")
 
-        # Setup queue for numbers
-        queue = Queue()
-        for number in numbers:
-            queue.put(number)
-            
-        # Shared variables for tracking progress
-        progress_data = {
-            'total': len(numbers),
-            'completed': 0,
-            'failed': 0,
-            'in_progress': 0,
-            'active_calls': {},  # Track active calls: {phone_number: call_sid}
-            'cancel_requested': False
-        }
+        # Fresh latency histograms for this campaign
+        campaign_id = time.strftime("%Y%m%d_%H%M%S")
+        tracer.begin_campaign(campaign_id)
+
+        # Shared, thread-safe progress state
+        progress = ProgressTracker(len(numbers))
+
+        # Draw the progress bar items once; redraws only move/recolor them
+        bar_rect = progress_bar.create_rectangle(0, 0, 0, 30, fill="#ff9999", outline="")
+        bar_text = progress_bar.create_text(225, 15, text="0.0%", font=self.normal_font)
         
-        # Function to update the progress UI
-        def update_progress_ui():
-            completed = progress_data['completed']
-            failed = progress_data['failed']
-            in_progress = progress_data['in_progress']
-            total = progress_data['total']
+        # Function to update the progress UI, called by the refresher at a fixed frame rate
+        def update_progress_ui(snapshot):
+            completed = snapshot['completed']
+            failed = snapshot['failed']
+            in_progress = snapshot['in_progress']
+            total = snapshot['total']
             
             # Update labels
             completed_calls_label.config(text=str(completed))
@@ -659,7 +820,6 @@ class TwilioCallBotGUI:
             
             # Calculate percentage and update progress bar
             percent_done = ((completed + failed) / total) * 100 if total > 0 else 0
-            progress_bar.delete("all")
             bar_width = 450 * (percent_done / 100)
             
             # Draw progress bar with gradient color
@@ -670,11 +830,14 @@ class TwilioCallBotGUI:
             else:
                 fill_color = "#99cc99"  # Light green
                 
-            progress_bar.create_rectangle(0, 0, bar_width, 30, fill=fill_color, outline="")
-            progress_bar.create_text(225, 15, text=f"{percent_done:.1f}%", font=self.normal_font)
+            progress_bar.coords(bar_rect, 0, 0, bar_width, 30)
+            progress_bar.itemconfig(bar_rect, fill=fill_color)
+            progress_bar.itemconfig(bar_text, text=f"{percent_done:.1f}%")
             
             # Update status text
-            if completed + failed == total:
+            if snapshot['cancel_requested'] and completed + failed < total:
+                progress_status.config(text="Cancelling remaining calls...")
+            elif completed + failed == total:
                 if failed > 0:
                     progress_status.config(text=f"Completed with {failed} failed calls")
                 else:
@@ -684,108 +847,80 @@ class TwilioCallBotGUI:
                 
             # Update main window status as well
             self.status_label.config(text=f"Status: Calls {percent_done:.1f}% complete")
+
+        ProgressRefresher(progress_window, progress, update_progress_ui, PROGRESS_REFRESH_MS).start()
+
+        dashboard = ThroughputDashboard(dashboard_frame, progress, self.small_font, self.bg_color,
+                                        interval_ms=DASHBOARD_REFRESH_MS)
+        dashboard.pack(fill=tk.X)
+        dashboard.start()
             
         # Handle cancel button click
         def request_cancel():
             if messagebox.askyesno("Cancel Calls", "Are you sure you want to cancel all remaining calls?"):
-                progress_data['cancel_requested'] = True
                 cancel_button.config(text="Cancelling...", state=tk.DISABLED)
-                progress_status.config(text="Cancelling remaining calls...")
+                # Hanging up goes over the network, so keep it off the Tk thread
+                threading.Thread(target=dispatcher.cancel, daemon=True).start()
                 
         cancel_button.config(command=request_cancel)
 
-        def process_numbers():
-            while not progress_data['cancel_requested']:
-                try:
+        results = ResultRecorder(campaign_id)
+        dispatcher = CallDispatcher(bot, numbers, script_text, progress, results=results,
+                                    calls_per_second=config.get('max_calls_per_second'),
+                                    campaign_id=campaign_id, source=scheduler, variants=variants)
+        machine_detector.configure(machine_policy)
+        if variants or machine_policy:
+            # Have every variant's audio and the voicemail cached before the first call goes out
+            def presynthesize_and_start():
+                if variants:
                     try:
-                        number = queue.get_nowait()
-                    except Empty:
-                        break
-
-                    # Update in_progress count
-                    progress_data['in_progress'] += 1
-                    progress_window.after(1, update_progress_ui)
-                    
+                        variants.presynthesize(tts)
+                    except Exception as e:
+                        logging.error(f"Variant pre-synthesis failed: {e}")
+                if machine_policy:
                     try:
-                        call_sid = bot.make_call(number, script_text)
-                        if call_sid:
-                            # Add to active calls
-                            progress_data['active_calls'][number] = call_sid
-                            
-                            while True:
-                                status = bot.get_call_status(call_sid)
-                                if status in ['completed', 'failed', 'busy', 'no-answer', 'canceled']:
-                                    with open(SUCCESS_FILE if status == 'completed' else RETRY_FILE, 'a') as f:
-                                        f.write(f"{number},{call_sid},{status}\n")
-                                    
-                                    # Update progress data
-                                    if status == 'completed':
-                                        progress_data['completed'] += 1
-                                    else:
-                                        progress_data['failed'] += 1
-                                        
-                                    progress_data['in_progress'] -= 1
-                                    # Remove from active calls
-                                    if number in progress_data['active_calls']:
-                                        del progress_data['active_calls'][number]
-                                        
-                                    progress_window.after(1, update_progress_ui)
-                                    break
-                                time.sleep(1)
-                        else:
-                            with open(RETRY_FILE, 'a') as f:
-                                f.write(f"{number},NO_SID,failed_to_initiate\n")
-                            progress_data['failed'] += 1
-                            progress_data['in_progress'] -= 1
-                            progress_window.after(1, update_progress_ui)
+                        machine_detector.prepare(tts, bot.audio_store)
                     except Exception as e:
-                        logging.error(f"Error processing number {number}: {e}")
-                        with open(RETRY_FILE, 'a') as f:
-                            f.write(f"{number},ERROR,{str(e)}\n")
-                        progress_data['failed'] += 1
-                        progress_data['in_progress'] -= 1
-                        progress_window.after(1, update_progress_ui)
-                    finally:
-                        queue.task_done()
-                except Exception as e:
-                    logging.error(f"Thread error: {e}")
-                    break
+                        # Without the voicemail audio, machines are hung up on instead
+                        logging.error(f"Voicemail synthesis failed: {e}")
+                dispatcher.start(thread_count)
 
-        threads = []
-        for _ in range(thread_count):
-            thread = threading.Thread(target=process_numbers)
-            thread.daemon = True
-            thread.start()
-            threads.append(thread)
+            threading.Thread(target=presynthesize_and_start, daemon=True).start()
+        else:
+            dispatcher.start(thread_count)
 
         def monitor_progress():
-            if queue.empty() and progress_data['in_progress'] == 0:
+            if dispatcher.is_finished():
                 # All done - enable the close button
-                if not progress_data['cancel_requested']:
-                    cancel_button.config(text="Close", command=progress_window.destroy, 
-                                       bg=self.secondary_color, state=tk.NORMAL)
-                else:
-                    cancel_button.config(text="Close", command=progress_window.destroy, 
-                                       bg=self.secondary_color, state=tk.NORMAL)
+                cancel_button.config(text="Close", command=progress_window.destroy, 
+                                   bg=self.secondary_color, state=tk.NORMAL)
                     
+                tracer.dump(f"campaign_{campaign_id}_latency.json")
+                results.close()
+                variant_text = ""
+                if variants:
+                    variants.dump(f"campaign_{campaign_id}_variants.json")
+                    variant_text = "\n\n" + variants.summary_text()
+
                 # Show completion message
-                total_completed = progress_data['completed']
-                total_failed = progress_data['failed']
+                total_completed = progress.completed
+                total_failed = progress.failed
                 
-                if progress_data['cancel_requested']:
+                if progress.cancel_requested:
                     self.status_label.config(text=f"Status: Calls cancelled. {total_completed} completed, {total_failed} failed")
-                    messagebox.showinfo("Calls Cancelled", f"Call process was cancelled.\n\n{total_completed} calls completed\n{total_failed} calls failed")
+                    drained = ""
+                    if dispatcher.cancel_latency is not None:
+                        drained = f"\nAll calls ended {dispatcher.cancel_latency:.1f}s after cancelling"
+                    messagebox.showinfo("Calls Cancelled", f"Call process was cancelled.\n\n{total_completed} calls completed\n{total_failed} calls failed{drained}{variant_text}")
                 else:
                     self.status_label.config(text=f"Status: All calls completed. {total_completed} successful, {total_failed} failed")
                     
                     if total_failed > 0:
                         message = f"All calls completed.\n\n{total_completed} calls were successful\n{total_failed} calls failed"
-                        icon = "warning"
                     else:
                         message = f"All {total_completed} calls completed successfully!"
-                        icon = "info"
                         
-                    messagebox.showinfo("Process Complete", message)
+                    messagebox.showinfo("Process Complete", message + variant_text)
                 
             else:
                 # Still processing - check again in a second
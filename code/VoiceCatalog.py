@@ -0,0 +1,150 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+VOICES_API_URL = "https://api.elevenlabs.io/v1/voices"
+
+
+class VoiceInfo:
+    """The parts of an ElevenLabs voice the app uses"""
+
+    __slots__ = ('voice_id', 'name', 'category', 'labels')
+
+    def __init__(self, voice_id, name, category='', labels=None):
+        self.voice_id = voice_id
+        self.name = name
+        self.category = category or ''
+        self.labels = labels or {}
+
+    @classmethod
+    def from_api(cls, data):
+        return cls(data['voice_id'], data.get('name', ''), data.get('category'), data.get('labels'))
+
+    def to_dict(self):
+        return {'voice_id': self.voice_id, 'name': self.name, 'category': self.category, 'labels': self.labels}
+
+
+class VoiceCatalog:
+    """
+    Disk-backed cache of the account's ElevenLabs voices.
+    The cached list is served immediately on startup; when it is older than the TTL a
+    background refresh revalidates it with the stored ETag, so an unchanged catalog
+    costs a 304 instead of a full download.
+    """
+
+    def __init__(self, cache_file, ttl):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.voices = []
+        self.by_id = {}
+        self.fetched_at = 0.0
+        self.etag = None
+        self.account = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    @staticmethod
+    def _account_key(api_key):
+        # Voices are per account; store a hash so the key itself never lands in the cache file
+        return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+    def _set_voices(self, voices):
+        # Build the new index first, then swap both references
+        by_id = {voice.voice_id: voice for voice in voices}
+        self.voices = voices
+        self.by_id = by_id
+
+    def load(self, api_key):
+        """Load the cached catalog for this API key from disk; returns False if there is none"""
+        account = self._account_key(api_key)
+        if account != self.account:
+            # Never show one account's voices under another key
+            self._set_voices([])
+            self.etag = None
+            self.fetched_at = 0.0
+            self.account = account
+        try:
+            with open(self.cache_file, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logging.error(f"Error reading voice cache {self.cache_file}: {e}")
+            return False
+
+        if data.get('account') != self.account:
+            return False
+        self._set_voices([VoiceInfo(**voice) for voice in data.get('voices', [])])
+        self.fetched_at = data.get('fetched_at', 0.0)
+        self.etag = data.get('etag')
+        logging.info(f"Loaded {len(self.voices)} voices from cache")
+        return True
+
+    def _save(self):
+        data = {
+            'account': self.account,
+            'fetched_at': self.fetched_at,
+            'etag': self.etag,
+            'voices': [voice.to_dict() for voice in self.voices],
+        }
+        tmp_path = f"{self.cache_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.cache_file)
+
+    def is_stale(self):
+        return not self.voices or time.time() - self.fetched_at > self.ttl
+
+    def refresh(self, api_key):
+        """Revalidate against the API; returns True if the voice list changed"""
+        import requests
+
+        headers = {'xi-api-key': api_key}
+        if self.etag and self.voices:
+            headers['If-None-Match'] = self.etag
+        response = requests.get(VOICES_API_URL, headers=headers, timeout=15)
+
+        if response.status_code == 304:
+            self.fetched_at = time.time()
+            self._save()
+            logging.info("Voice catalog unchanged")
+            return False
+
+        response.raise_for_status()
+        self.account = self._account_key(api_key)
+        self._set_voices([VoiceInfo.from_api(voice) for voice in response.json().get('voices', [])])
+        self.etag = response.headers.get('ETag')
+        self.fetched_at = time.time()
+        self._save()
+        logging.info(f"Cached {len(self.voices)} voices from ElevenLabs")
+        return True
+
+    def refresh_async(self, api_key):
+        """Refresh in a background thread; listeners are told when the list changes"""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                if self.refresh(api_key):
+                    for listener in list(self._listeners):
+                        listener()
+            except Exception as e:
+                logging.error(f"Error refreshing voice catalog: {e}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
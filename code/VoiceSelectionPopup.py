@@ -17,11 +17,15 @@ class VoiceSelectionPopup:
         self.selected_voice_id = tts_service.voice_id  # Initialize with current voice
         self.selected_voice_name = tts_service.voice_name  # Initialize with current voice name
         self.voices = []  # Will store voice data (name, id)
+        self.search_index = []  # Lower-cased name/category/labels per voice, parallel to self.voices
+        self.filtered = []  # Indices into self.voices that match the search
+        self.last_query = ""
+        self.offset = 0  # First filtered row currently rendered
         
         # Create popup window
         self.popup = tk.Toplevel(master)
         self.popup.title("Voice Selection")
-        self.popup.geometry("500x600")
+        self.popup.geometry("500x640")
         self.popup.resizable(False, False)
         self.popup.transient(master)  # Set as transient to main window (dialog)
         self.popup.grab_set()  # Make window modal
@@ -124,6 +128,12 @@ class VoiceSelectionPopup:
         list_frame = ttk.LabelFrame(content_frame, text="Available Voices", padding=(15, 10))
         list_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 15))
         
+        # Type-ahead search over name, category and labels (accent, language, ...)
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(list_frame, textvariable=self.search_var, font=('Segoe UI', 10))
+        search_entry.pack(fill=tk.X, pady=(0, 8))
+        self.search_var.trace_add('write', lambda *args: self.apply_filter())
+
         # Create voice listbox with custom styling
         listbox_frame = ttk.Frame(list_frame)
         listbox_frame.pack(fill=tk.BOTH, expand=True)
@@ -143,12 +153,11 @@ class VoiceSelectionPopup:
             selectforeground='white'
         )
         
-        # Scrollbar with improved style
-        scrollbar = ttk.Scrollbar(listbox_frame, orient="vertical", command=self.voice_listbox.yview)
-        self.voice_listbox.configure(yscrollcommand=scrollbar.set)
+        # The listbox only ever holds the visible rows, so the scrollbar drives our own offset
+        self.scrollbar = ttk.Scrollbar(listbox_frame, orient="vertical", command=self.scroll_rows)
         
         self.voice_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         # Preview section
         preview_frame = ttk.LabelFrame(content_frame, text="Voice Preview", padding=(15, 10))
@@ -231,48 +240,152 @@ class VoiceSelectionPopup:
         # Bind selection event
         self.voice_listbox.bind('<<ListboxSelect>>', self.on_voice_select)
         self.voice_listbox.bind('<Double-1>', lambda e: self.preview_voice())
+        self.voice_listbox.bind('<MouseWheel>', lambda e: self.scroll_rows('scroll', -1 if e.delta > 0 else 1, 'units'))
+        self.voice_listbox.bind('<Button-4>', lambda e: self.scroll_rows('scroll', -1, 'units'))
+        self.voice_listbox.bind('<Button-5>', lambda e: self.scroll_rows('scroll', 1, 'units'))
+        self.voice_listbox.bind('<Up>', lambda e: self.move_selection(-1))
+        self.voice_listbox.bind('<Down>', lambda e: self.move_selection(1))
         
         # Flag to track if a voice has been applied
         self.voice_applied = False
     
     def load_voices(self):
-        """Load available voices from the API"""
-        def fetch_voices():
+        """Fill the list from the cached voice catalog and follow background refreshes"""
+        catalog = self.tts_service.voice_catalog
+        self.populate_voices()
+
+        # The catalog refreshes on a worker thread; hop back onto the Tk thread to redraw
+        def on_refresh():
             try:
-                self.voices = self.tts_service.get_available_voices()
-                
-                # Clear listbox
-                self.voice_listbox.delete(0, tk.END)
-                
-                # Add voices to listbox
-                for voice_name, voice_id in self.voices:
-                    self.voice_listbox.insert(tk.END, f"{voice_name}")
-                    
-                    # Mark current selected voice
-                    if voice_id == self.tts_service.voice_id:
-                        idx = self.voices.index((voice_name, voice_id))
-                        self.voice_listbox.selection_set(idx)
-                        self.voice_listbox.see(idx)
-                
+                self.popup.after(0, self.populate_voices)
+            except tk.TclError:
+                pass
+
+        catalog.add_listener(on_refresh)
+        self.popup.bind('<Destroy>', lambda e: catalog.remove_listener(on_refresh) if e.widget is self.popup else None)
+
+        if catalog.is_stale():
+            if not self.voices:
+                self.status_label.config(text="Refreshing voice catalog...")
+            catalog.refresh_async(self.tts_service.api_key)
+
+    def populate_voices(self):
+        """Rebuild the search index from the current catalog and re-render"""
+        try:
+            catalog_voices = self.tts_service.available_voices
+            self.voices = [(voice.name, voice.voice_id) for voice in catalog_voices]
+            self.search_index = [
+                " ".join([voice.name, voice.category, *(str(v) for v in voice.labels.values())]).lower()
+                for voice in catalog_voices
+            ]
+            self.last_query = None
+            self.apply_filter()
+            
+            if self.voices:
                 self.status_label.config(text=f"Found {len(self.voices)} voices. Select one to preview.")
-                
-            except Exception as e:
-                logging.error(f"Error loading voices: {e}")
-                self.status_label.config(text=f"Error loading voices: {str(e)}")
-                messagebox.showerror("Error", f"Failed to load voices: {str(e)}")
-        
-        # Run in a separate thread to prevent UI freezing
-        threading.Thread(target=fetch_voices, daemon=True).start()
+            
+        except Exception as e:
+            logging.error(f"Error loading voices: {e}")
+            self.status_label.config(text=f"Error loading voices: {str(e)}")
+            messagebox.showerror("Error", f"Failed to load voices: {str(e)}")
+
+    def apply_filter(self):
+        """Filter the voices by the search text; every word must match somewhere"""
+        query = self.search_var.get().strip().lower()
+        tokens = query.split()
+
+        # A query that extends the previous one can only narrow the results
+        if self.last_query is not None and query.startswith(self.last_query):
+            candidates = self.filtered
+        else:
+            candidates = range(len(self.voices))
+
+        if tokens:
+            index = self.search_index
+            self.filtered = [i for i in candidates if all(t in index[i] for t in tokens)]
+        else:
+            self.filtered = list(candidates)
+        self.last_query = query
+
+        # Keep the selected voice in view if it survived the filter
+        self.offset = 0
+        for position, i in enumerate(self.filtered):
+            if self.voices[i][1] == self.selected_voice_id:
+                self.offset = max(0, position - self.visible_rows() // 2)
+                break
+        self.render_rows()
+
+    def visible_rows(self):
+        return int(self.voice_listbox.cget('height'))
+
+    def render_rows(self):
+        """Put only the visible window of the filtered list into the listbox"""
+        rows = self.visible_rows()
+        total = len(self.filtered)
+        self.offset = max(0, min(self.offset, total - rows))
+        window = self.filtered[self.offset:self.offset + rows]
+
+        self.voice_listbox.delete(0, tk.END)
+        for row, i in enumerate(window):
+            voice_name, voice_id = self.voices[i]
+            self.voice_listbox.insert(tk.END, voice_name)
+            if voice_id == self.selected_voice_id:
+                self.voice_listbox.selection_set(row)
+
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def scroll_rows(self, action, amount, unit=None):
+        """Scrollbar and mouse wheel handler working in filtered rows"""
+        if action == 'moveto':
+            self.offset = int(float(amount) * len(self.filtered))
+        elif action == 'scroll':
+            step = self.visible_rows() if unit == 'pages' else 1
+            self.offset += int(amount) * step
+        self.render_rows()
+        return "break"
+
+    def move_selection(self, delta):
+        """Keyboard navigation across the whole filtered list, not just the rendered rows"""
+        if not self.filtered:
+            return "break"
+        selection = self.voice_listbox.curselection()
+        position = self.offset + selection[0] + delta if selection else self.offset
+        position = max(0, min(position, len(self.filtered) - 1))
+
+        rows = self.visible_rows()
+        if position < self.offset:
+            self.offset = position
+        elif position >= self.offset + rows:
+            self.offset = position - rows + 1
+
+        self.selected_voice_name, self.selected_voice_id = self.voices[self.filtered[position]]
+        self.status_label.config(text=f"Selected: {self.selected_voice_name}")
+        self.render_rows()
+        self.prefetch_around(position)
+        return "break"
     
     def on_voice_select(self, event):
         """Handle voice selection from listbox"""
         if not self.voice_listbox.curselection():
             return
             
-        index = self.voice_listbox.curselection()[0]
-        if index < len(self.voices):
-            self.selected_voice_name, self.selected_voice_id = self.voices[index]
+        position = self.offset + self.voice_listbox.curselection()[0]
+        if position < len(self.filtered):
+            self.selected_voice_name, self.selected_voice_id = self.voices[self.filtered[position]]
             self.status_label.config(text=f"Selected: {self.selected_voice_name}")
+            self.prefetch_around(position)
+
+    def prefetch_around(self, position):
+        """Synthesize previews for the highlighted voice and its neighbours in the background"""
+        preview_text = self.preview_text.get().strip()
+        if not preview_text:
+            return
+        positions = [position, position + 1, position - 1]
+        voice_ids = [self.voices[self.filtered[p]][1] for p in positions if 0 <= p < len(self.filtered)]
+        self.tts_service.prefetch_previews(preview_text, voice_ids)
     
     def preview_voice(self):
         """Preview the selected voice"""
@@ -285,12 +398,8 @@ class VoiceSelectionPopup:
             messagebox.showinfo("Information", "Please enter text to preview.")
             return
             
-        # Temporarily set the voice ID for preview
-        original_voice_id = self.tts_service.voice_id
-        original_voice_name = self.tts_service.voice_name
-        
-        # Set the voice for preview
-        self.tts_service.set_voice(self.selected_voice_id, self.selected_voice_name)
+        # Preview the selected voice directly; the applied voice is left untouched
+        voice_id = self.selected_voice_id
         
         # Disable preview button during playback
         self.preview_button.config(state="disabled")
@@ -299,7 +408,7 @@ class VoiceSelectionPopup:
         
         def play_preview():
             try:
-                result = self.tts_service.preview_voice(preview_text)
+                result = self.tts_service.preview_voice(preview_text, voice_id)
                 if not result:
                     self.status_label.config(text="Preview failed. Please try again.")
                 else:
@@ -308,9 +417,6 @@ class VoiceSelectionPopup:
                 logging.error(f"Voice preview error: {e}")
                 self.status_label.config(text=f"Preview error: {str(e)}")
             finally:
-                # Restore original voice ID unless this voice has been applied
-                if self.popup.winfo_exists() and not self.voice_applied:  
-                    self.tts_service.set_voice(original_voice_id, original_voice_name)
                 # Re-enable buttons
                 if self.preview_button.winfo_exists():  
                     self.preview_button.config(state="normal")
@@ -0,0 +1,246 @@
+import http.client
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from queue import Empty, Queue
+from urllib.parse import quote, urlencode, urlsplit
+from AudioStore import get_audio_store
+from CallTrace import LatencyHistogram
+from constants import AUDIO_DIR
+
+# Twilio gives up on a webhook after 15 seconds
+TWILIO_WEBHOOK_TIMEOUT = 15.0
+ENDPOINTS = ('/status-callback', '/twiml', '/audio')
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+
+class RequestLatency(LatencyHistogram):
+    """Finer buckets than the call histograms: webhook handlers should answer in well under 1ms"""
+
+    BOUNDS = [0.00005 * (1.25 ** i) for i in range(60)]
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latency = RequestLatency()
+        self.codes = {}
+        self.errors = 0
+        self.slow = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, code=None, invalid=False):
+        self.latency.observe(seconds)
+        with self._lock:
+            # /twiml answers its error branch with a 200, so a bad body counts as its own failure
+            key = 'invalid' if invalid else str(code) if code is not None else 'error'
+            self.codes[key] = self.codes.get(key, 0) + 1
+            if invalid or code is None or code >= 400:
+                self.errors += 1
+            if seconds > TWILIO_WEBHOOK_TIMEOUT:
+                self.slow += 1
+
+
+class WebhookLoadTest:
+    """
+    Replays Twilio webhook traffic against a running app.
+
+    Calls start at a fixed rate (open loop, so a slow server shows up as queueing rather
+    than as a lower offered load). Each call sends what Twilio would: the initiated and
+    ringing status callbacks, the /twiml fetch, the audio download, then the in-progress
+    and completed callbacks, all form-encoded like the real thing. Worker threads keep
+    their own HTTP connections.
+    """
+
+    def __init__(self, base_url, calls_per_second, duration, concurrency=50, audio=None,
+                 audio_bytes=64 * 1024, timeout=TWILIO_WEBHOOK_TIMEOUT):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        if not audio and self.host not in LOCAL_HOSTS:
+            # The temporary audio file is written to the local store, which a remote app can't see
+            raise ValueError("--audio is required when the target app is not on this machine")
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.https = parts.scheme == 'https'
+        self.calls_per_second = calls_per_second
+        self.duration = duration
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.audio = audio
+        self.audio_bytes = audio_bytes
+        self.from_number = "+15005550006"
+        self.account_sid = "AC" + uuid.uuid4().hex
+        self.stats = {endpoint: EndpointStats() for endpoint in ENDPOINTS}
+        self.start_lag = RequestLatency()
+        self.calls_done = 0
+        self._done_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = self._local.conn = cls(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def _request(self, endpoint, method, path, body=None, expect=None):
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if body is not None else {}
+        start = time.monotonic()
+        try:
+            conn = self._connection()
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            content = response.read()
+            code = response.status
+            invalid = expect is not None and expect not in content
+        except Exception as e:
+            logging.debug(f"{method} {path} failed: {e}")
+            conn = getattr(self._local, 'conn', None)
+            if conn is not None:
+                conn.close()
+            self._local.conn = None
+            code = None
+            invalid = False
+        self.stats[endpoint].record(time.monotonic() - start, code, invalid)
+
+    def _status(self, params, status, **extra):
+        body = urlencode(dict(params, CallStatus=status, **extra))
+        self._request('/status-callback', 'POST', '/status-callback', body)
+
+    def _call(self, index):
+        params = {
+            'AccountSid': self.account_sid,
+            'CallSid': "CA" + uuid.uuid4().hex,
+            'From': self.from_number,
+            'To': f"+1555{index % 10_000_000:07d}",
+            'Direction': 'outbound-api',
+            'ApiVersion': '2010-04-01',
+        }
+        self._status(params, 'initiated')
+        self._status(params, 'ringing')
+        self._request('/twiml', 'POST', f"/twiml?audio={quote(self.audio)}",
+                      urlencode(dict(params, CallStatus='in-progress')), expect=b'<Play>')
+        self._request('/audio', 'GET', f"/audio/{quote(self.audio)}")
+        self._status(params, 'in-progress')
+        self._status(params, 'completed', CallDuration='30', Duration='1')
+        with self._done_lock:
+            self.calls_done += 1
+
+    def _worker(self, jobs, finished):
+        while True:
+            try:
+                index, due = jobs.get(timeout=0.1)
+            except Empty:
+                if finished.is_set():
+                    return
+                continue
+            self.start_lag.observe(max(0.0, time.monotonic() - due))
+            self._call(index)
+
+    def _make_audio(self):
+        """Put a throwaway audio file in the store for /twiml and /audio to find"""
+        relative, path = get_audio_store(AUDIO_DIR).new_path(f"loadtest_{uuid.uuid4().hex}.mp3")
+        with open(f"{path}.tmp", 'wb') as f:
+            f.write(os.urandom(self.audio_bytes))
+        os.replace(f"{path}.tmp", path)
+        return relative, path
+
+    def run(self):
+        created = None
+        if not self.audio:
+            self.audio, created = self._make_audio()
+
+        jobs = Queue()
+        finished = threading.Event()
+        workers = [threading.Thread(target=self._worker, args=(jobs, finished), daemon=True)
+                   for _ in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+
+        # Enqueue calls on schedule; workers pick them up as they free up
+        interval = 1.0 / self.calls_per_second
+        start = time.monotonic()
+        total = int(self.calls_per_second * self.duration)
+        try:
+            for index in range(total):
+                due = start + index * interval
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                jobs.put((index, due))
+            finished.set()
+            for worker in workers:
+                worker.join()
+        finally:
+            finished.set()
+            if created:
+                os.remove(created)
+        return self.report(time.monotonic() - start, total)
+
+    def report(self, elapsed, offered):
+        endpoints = {}
+        for endpoint, stats in self.stats.items():
+            summary = stats.latency.summary()
+            endpoints[endpoint] = {
+                'requests': summary['count'],
+                'requests_per_second': summary['count'] / elapsed if elapsed else 0.0,
+                'errors': stats.errors,
+                'error_rate': stats.errors / summary['count'] if summary['count'] else 0.0,
+                'over_twilio_timeout': stats.slow,
+                'status_codes': dict(stats.codes),
+                'latency': summary,
+            }
+        return {
+            'elapsed': elapsed,
+            'calls_offered': offered,
+            'calls_completed': self.calls_done,
+            'offered_calls_per_second': self.calls_per_second,
+            'achieved_calls_per_second': self.calls_done / elapsed if elapsed else 0.0,
+            'call_start_lag': self.start_lag.summary(),
+            'endpoints': endpoints,
+        }
+
+
+def format_report(report):
+    lines = [
+        f"{report['calls_completed']}/{report['calls_offered']} calls in {report['elapsed']:.1f}s "
+        f"({report['achieved_calls_per_second']:.1f}/s achieved, {report['offered_calls_per_second']:.1f}/s offered)",
+        f"Call start lag p50 {report['call_start_lag']['p50'] * 1000:.1f}ms, "
+        f"p99 {report['call_start_lag']['p99'] * 1000:.1f}ms",
+        "",
+        f"{'endpoint':<18}{'req':>9}{'req/s':>10}{'errors':>9}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}",
+    ]
+    for endpoint, stats in report['endpoints'].items():
+        latency = stats['latency']
+        lines.append(f"{endpoint:<18}{stats['requests']:>9}{stats['requests_per_second']:>10.1f}"
+                     f"{stats['error_rate']:>9.1%}{latency['p50'] * 1000:>10.2f}{latency['p90'] * 1000:>10.2f}"
+                     f"{latency['p99'] * 1000:>10.2f}{latency['max'] * 1000:>10.2f}")
+        failing = {code: count for code, count in stats['status_codes'].items() if not code.startswith('2')}
+        if failing:
+            lines.append(f"{'':<18}failed: {failing}")
+        if stats['over_twilio_timeout']:
+            lines.append(f"{'':<18}{stats['over_twilio_timeout']} requests slower than Twilio's 15s timeout")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load-test the webhook endpoints with simulated Twilio traffic")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of the running app")
+    parser.add_argument("--cps", type=float, default=20, help="Simulated calls started per second")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to keep starting calls")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent simulated calls")
+    parser.add_argument("--audio", help="Existing audio path in the app's store; required for a remote app, "
+                                        "otherwise a temporary file is made in the local store")
+    parser.add_argument("--audio-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    try:
+        test = WebhookLoadTest(args.url, args.cps, args.duration, args.concurrency, args.audio, args.audio_bytes)
+    except ValueError as e:
+        parser.error(str(e))
+    result = test.run()
+    print(json.dumps(result, indent=4) if args.json else format_report(result))
@@ -7,12 +7,63 @@ INPUT_FILE = ''
 CURRENT_SCRIPT = ''
 NGROK_PROCESS = None
 AUDIO_DIR = 'audio_files'
+TTS_CACHE_DIR = 'audio_files/tts_cache'
 SUCCESS_FILE = 'success.txt'
 RETRY_FILE = 'retries.txt'
+RESULTS_DIR = 'results'
+# Seconds between saves of a campaign's running summary
+RESULTS_SUMMARY_INTERVAL = 5
 NUMBER_REGEX = r'[^0-9]'
+# Call audio is kept while a call uses it, then collected by age or total size
+AUDIO_STORE_MAX_BYTES = 2 * 1024 ** 3
+AUDIO_STORE_MAX_AGE = 60 * 60
+AUDIO_STORE_MIN_AGE = 10 * 60
+AUDIO_GC_INTERVAL = 5 * 60
+NGROK_API_URL = 'http://localhost:4040/api/tunnels'
+NGROK_READY_TIMEOUT = 15
+VOICE_CACHE_FILE = 'voice_cache.json'
+VOICE_CACHE_TTL = 24 * 60 * 60
+PREVIEW_CACHE_SIZE = 64
+
+# Selectable TTS engines; the first is the default
+TTS_ENGINES = ['ElevenLabs', 'Offline', 'Fake']
 CONFIG_FILE = ConfigHelper.CONFIG_FILE
 
-# Initialize constants with values from config
+# Scripts at least this long are split into sentences and synthesized in parallel
+TTS_CHUNK_MIN_CHARS = 200
+# Threads one script uses for its chunks. Only a ceiling: every cache miss also waits
+# for a TTSBudget slot, so provider requests stay within the cap below
+TTS_CHUNK_THREADS = 4
+# Provider-side cap on simultaneous synthesis requests across all calls and scripts;
+# config.json's tts_max_concurrent_requests overrides it
+TTS_MAX_CONCURRENT_REQUESTS = 5
+
+# Progress window redraw interval (10 frames per second)
+PROGRESS_REFRESH_MS = 100
+DASHBOARD_REFRESH_MS = 1000
+
+# Call workers block on the status board until a callback arrives, waking this often
+# to see whether the campaign was cancelled
+STATUS_WAIT_TIMEOUT = 1.0
+# Lost status callbacks are caught up by listing the account's calls in pages this often
+RECONCILE_INTERVAL = 10
+RECONCILE_PAGE_SIZE = 1000
+# Status callbacks are buffered in memory and applied in batches by a background
+# thread; events arriving while the buffer is full are dropped (the reconciler
+# recovers their final statuses)
+STATUS_QUEUE_CAPACITY = 65536
+STATUS_BATCH_SIZE = 500
+STATUS_FLUSH_INTERVAL = 0.05
+# Shared database for campaigns sharded across processes/hosts, and how long a
+# worker's claim on a number lasts without a heartbeat
+SHARD_DB_FILE = 'campaigns.db'
+SHARD_LEASE_SECONDS = 60
+
+# Concurrent hang-up requests when a campaign is aborted
+CANCEL_MAX_PARALLEL = 10
+
+# Startup snapshot of the config. Long-lived code should read ConfigHelper.config_service
+# (or subscribe to it) so it follows config.json changes at runtime.
 TWILIO_ACCOUNT_SID = ConfigHelper.get_twilio_account_sid()
 TWILIO_AUTH_TOKEN = ConfigHelper.get_twilio_auth_token()
 TWILIO_PHONE_NUMBER = ConfigHelper.get_twilio_phone_number()
@@ -1,27 +1,74 @@
+from StartupTimer import startup_timer
+import mimetypes
 import os
 import tkinter as tk
 from tkinter import messagebox
 import threading
-from flask import Flask, send_file, request, Response
+from flask import Flask, send_file, request, Response, g
 from TwilioCallBotGUI import TwilioCallBotGUI
-from constants import CONFIG_FILE, AUDIO_DIR, CURRENT_SCRIPT, WEBHOOK_URL
-import json
+from constants import CONFIG_FILE, AUDIO_DIR
+import ConfigHelper
 import logging
-from twilio.twiml.voice_response import VoiceResponse 
-
-# Set up logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+from CallTrace import tracer
+from CallStatusBoard import status_events
+from MachineDetection import machine_detector
+from StructuredLogging import SAMPLED, log_pipeline, pop_context, push_context
+from Metrics import metrics, AUDIO_BYTES_SERVED, WEBHOOK_LATENCY, WEBHOOK_REQUESTS
+import time
+from urllib.parse import quote
+from AudioStore import get_audio_store
+
+# Set up logging: JSON records through a background queue listener. The level and
+# debug sampling follow config.json at runtime.
+_log_config = ConfigHelper.load_config()
+log_pipeline.setup(level=_log_config.get('log_level', 'DEBUG'),
+                   debug_sample_rate=_log_config.get('log_debug_sample_rate', 1))
 
 app = Flask(__name__)  # Flask instance
-
-@app.route("/audio/<filename>")
+audio_store = get_audio_store(AUDIO_DIR)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.monotonic()
+    # Twilio webhooks carry the CallSid; tag everything logged while handling them
+    call_sid = request.values.get('CallSid')
+    if call_sid:
+        g.log_token = push_context(campaign_id=tracer.campaign, call_sid=call_sid,
+                                   number=request.values.get('To'))
+
+@app.teardown_request
+def clear_log_context(exc):
+    if 'log_token' in g:
+        pop_context(g.log_token)
+
+@app.after_request
+def record_request_metrics(response):
+    # Label by route rule rather than raw path so audio filenames don't explode cardinality
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    if 'request_start' in g:
+        WEBHOOK_LATENCY.labels(endpoint).observe(time.monotonic() - g.request_start)
+    WEBHOOK_REQUESTS.labels(endpoint, str(response.status_code)).inc()
+    return response
+
+@app.route("/metrics")
+def serve_metrics():
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4')
+
+@app.route("/audio/<path:filename>")
 def serve_audio(filename):
+    tracer.mark_audio(filename, 'audio_start')
     try:
-        audio_path = os.path.join(AUDIO_DIR, filename)
-        return send_file(audio_path, mimetype='audio/mpeg')
+        # Never hand out a file that is still being written
+        if not audio_store.is_ready(filename):
+            return "File not found", 404
+        audio_path = audio_store.resolve(filename)
+        # The offline and fake TTS backends produce WAV rather than MP3
+        mimetype = mimetypes.guess_type(filename)[0] or 'audio/mpeg'
+        response = send_file(audio_path, mimetype=mimetype)
+        AUDIO_BYTES_SERVED.inc(os.path.getsize(audio_path))
+        # The body streams after we return, so stop the clock when the response closes
+        response.call_on_close(lambda: tracer.mark_audio(filename, 'audio_done'))
+        return response
     except Exception as e:
         logging.error(f"Error serving audio file {filename}: {e}")
         return "File not found", 404
@@ -29,34 +76,31 @@ def serve_audio(filename):
     
 @app.route("/twiml", methods=['GET', 'POST'])
 def generate_twiml():
+    from twilio.twiml.voice_response import VoiceResponse # type: ignore
     try:
         response = VoiceResponse()
         
         # Instead of relying on CURRENT_SCRIPT, get the audio file from the request
         call_sid = request.values.get('CallSid', '')
-        logging.info(f"Handling TwiML request for call SID: {call_sid}")
-        
-        # Look for the most recent audio file in the directory
-        audio_files = [f for f in os.listdir(AUDIO_DIR) if f.endswith('.mp3')]
-        if not audio_files:
-            raise ValueError("No audio files found in directory")
+        tracer.mark_sid(call_sid, 'twiml_start')
+        logging.debug("Handling TwiML request for call SID: %s", call_sid, extra=SAMPLED)
         
-        # Sort by creation time, newest first
-        audio_files.sort(key=lambda x: os.path.getctime(os.path.join(AUDIO_DIR, x)), reverse=True)
+        # make_call puts this call's audio path in the TwiML URL
+        audio = request.values.get('audio', '')
+        if not audio:
+            raise ValueError("No audio path in the TwiML request")
+        audio_path = audio_store.resolve(audio)
+        audio_url = f"{ConfigHelper.get_webhook_url()}/audio/{quote(audio)}"
         
-        # Use the most recent file
-        filename = audio_files[0]
-        audio_url = f"{WEBHOOK_URL}/audio/{filename}"
+        logging.debug("TwiML generating with audio URL: %s", audio_url, extra=SAMPLED)
         
-        logging.info(f"TwiML generating with audio URL: {audio_url}")
-        
-        # Check if the file exists
-        audio_path = os.path.join(AUDIO_DIR, filename)
-        if not os.path.exists(audio_path):
+        # Check the file is fully written
+        if not audio_store.is_ready(audio):
             logging.error(f"Audio file not found at: {audio_path}")
             raise FileNotFoundError(f"Audio file not found: {audio_path}")
         
         response.play(audio_url)
+        tracer.mark_sid(call_sid, 'twiml_done')
         
         return Response(str(response), content_type='application/xml')
     except Exception as e:
@@ -67,12 +111,34 @@ def generate_twiml():
         return Response(str(error_response), content_type='application/xml')
 @app.route("/status-callback", methods=['POST'])
 def status_callback():
+    # Only validate and buffer here; the board is updated in batches off the request thread
     call_sid = request.values.get('CallSid', '')
     call_status = request.values.get('CallStatus', '')
     from_number = request.values.get('From', '')
     to_number = request.values.get('To', '')
-    logging.info(f"Call Status Callback - SID: {call_sid}, Status: {call_status}, From: {from_number}, To: {to_number}")
-    return '', 200
+    if not call_sid or not call_status:
+        return 'Missing CallSid or CallStatus', 400
+    # The trace wants the arrival time, and marking it is an in-memory lookup
+    tracer.mark_status(call_sid, call_status)
+    status_events.put(call_sid, call_status)
+    logging.debug("Call Status Callback - SID: %s, Status: %s, From: %s, To: %s",
+                  call_sid, call_status, from_number, to_number, extra=SAMPLED)
+    return '', 204
+
+@app.route("/amd-callback", methods=['POST'])
+def amd_callback():
+    # Asynchronous answering machine detection result; any redirect or hangup happens off this thread
+    call_sid = request.values.get('CallSid', '')
+    answered_by = request.values.get('AnsweredBy', '')
+    if not call_sid or not answered_by:
+        return 'Missing CallSid or AnsweredBy', 400
+    try:
+        detection_seconds = int(request.values.get('MachineDetectionDuration', 0)) / 1000
+    except ValueError:
+        detection_seconds = 0.0
+    machine_detector.on_result(call_sid, answered_by, detection_seconds)
+    logging.debug("AMD Callback - SID: %s, AnsweredBy: %s", call_sid, answered_by, extra=SAMPLED)
+    return '', 204
 
 @app.route("/home", methods=['POST', 'GET'])
 def landing():
@@ -94,11 +160,10 @@ def landing():
 def check_config_file():
     try:
         if not os.path.exists(CONFIG_FILE):
-            return False
             logging.warning(f"Configuration file '{CONFIG_FILE}' does not exist.")
+            return False
         
-        with open(CONFIG_FILE, 'r') as f:
-            config = json.load(f)
+        config = ConfigHelper.load_config()
         
         required_fields = ['account_sid', 'auth_token', 'phone_number']
         for field in required_fields:
@@ -109,9 +174,6 @@ def check_config_file():
         logging.info("Configuration file contains valid Twilio credentials.")
         return True
 
-    except json.JSONDecodeError as e:
-        logging.error(f"Error decoding JSON in '{CONFIG_FILE}': {e}")
-        return False
     except Exception as e:
         logging.error(f"Unexpected error while validating config file: {e}")
         return False
@@ -124,23 +186,22 @@ if __name__ == "__main__":
     try:
         logging.info("Initializing the application...")
 
+        startup_timer.record("imports", startup_timer.elapsed())
+
         # Create Tkinter root window
-        root = tk.Tk()
+        with startup_timer.stage("tk root"):
+            root = tk.Tk()
 
-        # Create GUI
+        # Create GUI; this also ensures the config file, audio directory and ngrok
+        # tunnel exist and loads the configuration with the fresh webhook URL
         gui = TwilioCallBotGUI(root)
 
-        # Ensure config file exists
-        gui.ensure_config_file()
-
-        # Create audio directory if it doesn't exist
-        gui.create_audio_dir()
-
-        # Ensure ngrok and webhook are initialized
-        gui.setup_ngrok()
+        # Pick up external edits to config.json while the app runs
+        ConfigHelper.config_service.subscribe(log_pipeline.on_config_change)
+        ConfigHelper.config_service.start_watching()
 
-        # Reload configuration to reflect the updated webhook URL
-        gui.load_config()
+        # Reclaim audio from finished calls in the background
+        audio_store.start_gc()
 
         # Check configuration file directly
         if not check_config_file():
@@ -166,6 +227,7 @@ if __name__ == "__main__":
             flask_thread.start()
             logging.info("Flask application started in a separate thread.")
 
+            startup_timer.report()
             root.mainloop()
 
     except Exception as e: